@@ -0,0 +1,4 @@
+"""
+    Benchmarks of the database package, run them from the project directory,
+    e.g. `python -m benchmarks.memory`
+"""
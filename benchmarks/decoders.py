@@ -0,0 +1,53 @@
+"""
+    Load time and retained memory of every installed JSON decoder, with and without
+    interning, on data/tickets.json scaled up by replicating its rows.
+    usage: python -m benchmarks.decoders [--scale 500] [--repeat 3]
+"""
+import argparse, gc, json, os, tempfile, time, tracemalloc
+from database.decoders import DECODERS, available_decoders
+from benchmarks.memory import write_scaled
+from constants import entities, TICKET
+
+
+def measure(decoder, path, repeat):
+    """Return best load seconds of the decoder and bytes retained by the loaded rows"""
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        decoder.load(path)
+        seconds.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    data = decoder.load(path)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return {'seconds': round(min(seconds), 4), 'retained_bytes': retained}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=500, help='times the tickets are replicated')
+    parser.add_argument('--repeat', type=int, default=3, help='loads per decoder, the best one is kept')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_scaled(entities[TICKET], args.scale, directory)
+        for name in available_decoders():
+            for intern in (False, True):
+                label = f'{name}+intern' if intern else name
+                results[label] = measure(DECODERS[name](intern=intern), path, args.repeat)
+        file_bytes = os.path.getsize(path)
+
+    baseline = results['json']['seconds']
+    for result in results.values():
+        result['speedup'] = round(baseline / result['seconds'], 2)
+    print(json.dumps({'scale': args.scale, 'file_bytes': file_bytes, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+    Export time and peak memory of every format against building the filter result and
+    serializing it, on data/tickets.json scaled up by replicating its rows.
+    usage: python -m benchmarks.export [--scale 500] [--fields _id status priority]
+"""
+import argparse, gc, json, os, tempfile, time, tracemalloc
+from database.export import FORMATS
+from database.source import Database
+from benchmarks.memory import write_scaled
+from constants import entities, TICKET
+
+
+def measure(function):
+    """Return seconds of running function and peak bytes allocated by a second run"""
+    gc.collect()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    # tracing slows allocations down, so it isn't timed
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(seconds, 4), 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=500, help='times the tickets are replicated')
+    parser.add_argument('--fields', nargs='*', default=None, help='exported fields, as default all of them')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database().connect(write_scaled(entities[TICKET], args.scale, directory))
+        rows = len(db.db)
+        path = os.path.join(directory, 'export')
+
+        def serialize_filter():
+            result = db.filter('has_incidents', False) + db.filter('has_incidents', True)
+            with open(path, 'w') as json_file:
+                json.dump(result, json_file)
+
+        results['filter+json.dump'] = measure(serialize_filter)
+        for export_format in FORMATS:
+            results[export_format] = measure(lambda: db.export(path, export_format, fields=args.fields))
+            results[export_format]['file_bytes'] = os.path.getsize(path)
+
+    print(json.dumps({'scale': args.scale, 'rows': rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+    Synthetic data generator that scales the bundled schemas to any number of rows,
+    rows are copies of bundled rows with fresh ids and shuffled field values
+"""
+import json, random
+from constants import entities, TICKET
+
+
+def load_templates(entity):
+    with open(entities[entity]) as json_file:
+        return json.load(json_file)
+
+
+def generate(entity, rows, seed=0):
+    """ Generate rows of an entity
+        entity: (str) one of constants.entities
+        rows: (int) number of rows
+        seed: (int) seed of the random generator, so runs are reproducible
+        :return: generator of dictionaries
+    """
+    generator = random.Random(seed)
+    templates = load_templates(entity)
+    # every field takes values seen in the bundled data, so cardinalities stay realistic
+    values = {}
+    for template in templates:
+        for field, value in template.items():
+            values.setdefault(field, []).append(value)
+
+    for number in range(rows):
+        item = dict(generator.choice(templates))
+        for field in item:
+            if field != '_id':
+                item[field] = generator.choice(values[field])
+        item['_id'] = number if isinstance(item['_id'], int) else f'{entity}-{number:08d}'
+        yield item
+
+
+def generate_tickets(rows, seed=0):
+    """Generate ticket rows, see generate"""
+    return list(generate(TICKET, rows, seed))
@@ -0,0 +1,58 @@
+"""
+    Memory benchmark of ColumnarDB against JSONDB on the bundled datasets
+    scaled up by replicating their rows.
+    usage: python -m benchmarks.memory [--scale 200]
+"""
+import argparse, gc, json, os, tempfile, time, tracemalloc
+from database.source import Database, JSONDB
+from database.columnar import ColumnarDB
+from constants import entities
+
+
+def write_scaled(path, scale, directory):
+    """Write dataset of path with every row repeated scale times and return the new path"""
+    with open(path) as json_file:
+        data = json.load(json_file)
+    scaled_path = os.path.join(directory, os.path.basename(path))
+    with open(scaled_path, 'w') as json_file:
+        json.dump(data * scale, json_file)
+    return scaled_path
+
+
+def measure(path, db_class):
+    """Return retained and peak bytes of connecting db_class to path and load seconds"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    db = Database().connect(path, db=db_class())
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del db
+    return {'retained_bytes': current, 'peak_bytes': peak, 'load_seconds': round(seconds, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=200, help='times each dataset is replicated')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for entity, path in entities.items():
+            scaled_path = write_scaled(path, args.scale, directory)
+            json_db = measure(scaled_path, JSONDB)
+            columnar_db = measure(scaled_path, ColumnarDB)
+            results[entity] = {
+                'file_bytes': os.path.getsize(scaled_path),
+                'JSONDB': json_db,
+                'ColumnarDB': columnar_db,
+                'ratio': round(json_db['retained_bytes'] / columnar_db['retained_bytes'], 2),
+            }
+
+    print(json.dumps({'scale': args.scale, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+    Speedup of the multi-process sharded scan against a single-threaded scan
+    of an un-indexed predicate over synthetic tickets.
+    usage: python -m benchmarks.parallel_scan [--rows 10000000] [--workers 1 2 4 8]
+"""
+import argparse, json, os, time
+from database.index import IndexPolicy
+from database.source import Database
+from benchmarks.generator import generate_tickets
+
+PREDICATE = 'description STARTSWITH "Nostrud" AND priority = "high"'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic tickets')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='worker counts to measure')
+    args = parser.parse_args()
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({w for w in (1, 2, 4, 8, 16) if w <= cores} | {cores})
+
+    db = Database().connect(generate_tickets(args.rows), index_policy=IndexPolicy(default='off'))
+
+    start = time.perf_counter()
+    expected = db.query(PREDICATE)
+    single = time.perf_counter() - start
+
+    results = []
+    for count in workers:
+        db.scan(PREDICATE, workers=count)  # first scan writes shards and warms up workers
+        start = time.perf_counter()
+        result = db.scan(PREDICATE, workers=count)
+        seconds = time.perf_counter() - start
+        assert result == expected
+        results.append({'workers': count, 'seconds': round(seconds, 4), 'speedup': round(single / seconds, 2)})
+
+    print(json.dumps({'rows': args.rows, 'cores': cores, 'predicate': PREDICATE,
+                      'single_thread_seconds': round(single, 4), 'parallel': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
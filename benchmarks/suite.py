@@ -0,0 +1,165 @@
+"""
+    Load, index build and query latency of the three entity DBs over synthetic
+    datasets of growing size, every dataset is measured in its own process so
+    peak RSS isn't shared between runs. Results are printed (or written) as JSON
+    to compare them between commits.
+    usage: python -m benchmarks.suite [--sizes 10000 100000 1000000] [--queries 1000] [--output result.json]
+"""
+import argparse, json, os, platform, random, subprocess, sys, tempfile, time
+from benchmarks.generator import generate
+from constants import entities, USER, TICKET, ORGANIZATION
+
+# measured field of every entity per value type
+FIELDS = {
+    USER: {'int': 'organization_id', 'str': 'role', 'bool': 'active', 'list': 'tags'},
+    TICKET: {'int': 'submitter_id', 'str': 'status', 'bool': 'has_incidents', 'list': 'tags'},
+    ORGANIZATION: {'int': '_id', 'str': 'name', 'bool': 'shared_tickets', 'list': 'domain_names'},
+}
+
+
+def write_dataset(entity, rows, seed, directory):
+    """Write rows synthetic items of entity as a JSON array one item at a time and return the path"""
+    path = os.path.join(directory, f'{entity}-{rows}.json')
+    with open(path, 'w') as json_file:
+        json_file.write('[')
+        for number, item in enumerate(generate(entity, rows, seed)):
+            json_file.write((',\n' if number else '\n') + json.dumps(item))
+        json_file.write('\n]')
+    return path
+
+
+def peak_rss_bytes():
+    """Return peak resident set size of the current process, None where it isn't available"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 2),
+        'p99_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 2),
+    }
+
+
+def query_values(items, field, count, generator):
+    """Return count searched values of field picked from random items (one element of lists)"""
+    values = []
+    while len(values) < count:
+        value = generator.choice(items).get(field)
+        if isinstance(value, list):
+            value = generator.choice(value) if value else None
+        if value is not None:
+            values.append(value)
+    return values
+
+
+def measure(entity, path, queries, seed):
+    """ Measure one dataset in the current process
+        :return: dictionary of connect, index build and query metrics
+    """
+    from database.source import Database
+
+    start = time.perf_counter()
+    db = Database().connect(path)
+    connect_seconds = time.perf_counter() - start
+    connect_rss = peak_rss_bytes()
+
+    generator = random.Random(seed)
+    # the first generated items are the first rows of the dataset, so searched values exist
+    items = list(generate(entity, min(len(db.db), 1000), seed))
+
+    fields = {}
+    total_queries, total_seconds = 0, 0.0
+    for value_type, field in FIELDS[entity].items():
+        start = time.perf_counter()
+        db.db.index(field)
+        index_seconds = time.perf_counter() - start
+
+        values = query_values(items, field, queries, generator)
+        metrics = {'field': field, 'index_build_seconds': round(index_seconds, 4)}
+        for method in ('get', 'filter'):
+            query = getattr(db, method)
+            samples = []
+            for value in values:
+                start = time.perf_counter()
+                query(field, value)
+                samples.append(time.perf_counter() - start)
+            metrics[method] = percentiles(samples)
+            total_queries += len(samples)
+            total_seconds += sum(samples)
+        fields[value_type] = metrics
+
+    return {
+        'rows': len(db.db),
+        'file_bytes': os.path.getsize(path),
+        'connect_seconds': round(connect_seconds, 4),
+        'connect_peak_rss_bytes': connect_rss,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'fields': fields,
+        'queries_per_second': round(total_queries / total_seconds, 1) if total_seconds else None,
+    }
+
+
+def run(entity, path, queries, seed):
+    """Measure one dataset in a new process"""
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.suite', '--measure', entity, path,
+         '--queries', str(queries), '--seed', str(seed)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='rows of every dataset')
+    parser.add_argument('--entities', nargs='+', default=list(entities), choices=list(entities))
+    parser.add_argument('--queries', type=int, default=1000, help='queries per field and method')
+    parser.add_argument('--seed', type=int, default=0, help='seed of generated data and queries')
+    parser.add_argument('--output', help='write JSON result to this path instead of printing it')
+    parser.add_argument('--measure', nargs=2, metavar=('ENTITY', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure, args.queries, args.seed)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.sizes:
+            for entity in args.entities:
+                path = write_dataset(entity, rows, args.seed, directory)
+                results.append({'entity': entity, **run(entity, path, args.queries, args.seed)})
+                os.remove(path)
+
+    report = json.dumps({
+        'commit': commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cores': os.cpu_count(),
+        'queries': args.queries,
+        'seed': args.seed,
+        'results': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
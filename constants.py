@@ -14,13 +14,23 @@ entities = {
     ORGANIZATION: 'data/organizations.json'
 }
 
+# foreign keys between entities
+# (entity, field, referenced entity, referenced field, relation name, reverse relation name)
+relations = [
+    (USER, 'organization_id', ORGANIZATION, '_id', 'organization', 'users'),
+    (TICKET, 'organization_id', ORGANIZATION, '_id', 'organization', 'tickets'),
+    (TICKET, 'submitter_id', USER, '_id', 'submitter', 'submitted_tickets'),
+    (TICKET, 'assignee_id', USER, '_id', 'assignee', 'assigned_tickets'),
+]
+
 MAIN_OPTIONS = """
  -----------------------------------
 |       Select one option           |
 |-----------------------------------|
 | 1. Search Zendesk                 |
 | 2. View list of searchable fields | 
-| 3. Quit                           |
+| 3. Full text search               |
+| 4. Quit                           |
  -----------------------------------
 """
 
@@ -0,0 +1,95 @@
+import asyncio
+from functools import partial
+from .decorators import required_connection
+from .source import Database
+
+
+class AsyncDatabase:
+    """
+        asyncio facade of Database for async web services, loading and scans run in an
+        executor so they don't block the event loop, lookups of built indexes are answered inline
+        unless a writer holds or waits for the read lock
+    """
+
+    def __init__(self, executor=None, batch_size=1000) -> None:
+        """ executor: (concurrent.futures.Executor) executor of blocking calls, the loop default as default
+            batch_size: (int) number of items of every page streamed by iter_filter
+        """
+        self.database = Database()
+        self.__executor = executor
+        self.__batch_size = batch_size
+
+    async def __run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, partial(func, *args))
+
+    def is_db_connected(self):
+        """Check whether db is connected to appropriate source"""
+        return self.database.is_db_connected()
+
+    async def connect(self, source, **kwargs):
+        """ Connect to data in the executor, accepts Database.connect arguments
+            :return: instance
+        """
+        await self.__run(partial(self.database.connect, source, **kwargs))
+        return self
+
+    def __inline(self, field, func, *args):
+        """ Run func inline when the field is indexed and the read lock of the db is free, a lookup
+            waiting for a writer would block the event loop
+            :return: (bool, result) whether func ran and its result
+        """
+        db = self.database.db
+        lock = getattr(db, 'lock', None)
+        if lock is None or not db.has_index(field) or not lock.acquire_read(blocking=False):
+            return False, None
+        try:
+            return True, func(*args)
+        finally:
+            lock.release_read()
+
+    @required_connection
+    async def get(self, field, value):
+        """ Return matched item"""
+        inline, result = self.__inline(field, self.database.get, field, value)
+        if inline:
+            return result
+        return await self.__run(self.database.get, field, value)
+
+    @required_connection
+    async def filter(self, field, value):
+        """ return filtered list based on matched result """
+        inline, result = self.__inline(field, self.database.filter, field, value)
+        if inline:
+            return result
+        return await self.__run(self.database.filter, field, value)
+
+    @required_connection
+    async def fields(self):
+        """ return fields list"""
+        return self.database.fields()
+
+    @required_connection
+    async def iter_filter(self, field, value):
+        """ Stream filtered items page by page with keyset cursors, only one page is held at a time
+            and control goes back to the event loop after every page
+            :return: async iterator of matched items
+        """
+        cursor = None
+        while True:
+            inline, page = self.__inline(field, self.database.page, field, value, self.__batch_size, cursor)
+            if inline:
+                await asyncio.sleep(0)
+            else:
+                page = await self.__run(self.database.page, field, value, self.__batch_size, cursor)
+            for item in page:
+                yield item
+            if page.cursor is None:
+                return
+            cursor = page.cursor
+
+    @required_connection
+    async def call(self, method, *args, **kwargs):
+        """ Run any other Database method (query, search, between, ...) in the executor
+            method: (str) name of the method
+        """
+        return await self.__run(partial(getattr(self.database, method), *args, **kwargs))
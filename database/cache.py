@@ -0,0 +1,96 @@
+import sys, threading
+from collections import OrderedDict
+
+
+def normalize_value(value):
+    """ Normalize searched value, values that match the same rows get the same key
+        (True == 1 and False == 0 with JSONDB.exists rules)
+    """
+    if isinstance(value, bool):
+        return 'number', int(value)
+    return ('number' if isinstance(value, int) else type(value).__name__), value
+
+
+def estimate_size(result):
+    """Estimated bytes kept alive by a cached result"""
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        return sys.getsizeof(result)
+    return sys.getsizeof(result) + sum(sys.getsizeof(item) for item in result)
+
+
+class QueryCache:
+    """
+        Bounded LRU cache of get/filter results shared by databases, every entry keeps the
+        dataset version it was computed on, so entries of an older version are never returned
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024) -> None:
+        """ max_bytes: (int) estimated size cap of all cached results """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def key(entity, method, field, value):
+        return entity, method, field, normalize_value(value)
+
+    def lookup(self, key, version):
+        """ Return (True, result) for a cached result of the version, (False, None) otherwise """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                # computed on an older version of the dataset
+                self.__remove(key)
+                self.invalidations += 1
+            self.misses += 1
+            return False, None
+
+    def store(self, key, version, result):
+        """Cache result of key computed on the version, evicting least recently used entries"""
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (version, result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.__remove(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def __remove(self, key):
+        self.size -= self.__entries.pop(key)[2]
+
+    def invalidate(self, entity=None):
+        """Drop cached results of an entity, or all of them"""
+        with self.__lock:
+            for key in [key for key in self.__entries if entity is None or key[0] == entity]:
+                self.__remove(key)
+                self.invalidations += 1
+
+    def stats(self):
+        """Return hit, miss, eviction and invalidation counters and the cached size"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self.__entries),
+            'size_bytes': self.size,
+            'max_bytes': self.max_bytes,
+        }
+
+    def __len__(self):
+        return len(self.__entries)
@@ -0,0 +1,368 @@
+from array import array
+from bisect import bisect_right
+from .exceptions import *
+from .source import BaseDB, JSONDB
+from .schema import Schema
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, batch filtering falls back to a python pass
+    numpy = None
+
+ABSENT = -1
+
+
+class Column:
+    """
+        Base class of all columns, a column stores values of one field for all rows
+        * rows where the field is missing or null are absent
+    """
+
+    def __init__(self, field) -> None:
+        self.field = field
+
+    def value(self, position):
+        """Return python value stored at position (None when absent)"""
+        raise NotImplementedError()
+
+    def match(self, value):
+        """Return sorted positions of rows matching the value with JSONDB.exists rules"""
+        raise NotImplementedError()
+
+    def match_many(self, values):
+        """ Match several values in one pass over the column
+            values: (list) values to match
+            :return: dictionary of value to sorted positions, values without match are omitted
+        """
+        return {value: self.match(value) for value in values}
+
+
+def group_codes(codes, wanted):
+    """ Group positions of codes that are wanted in one pass
+        codes: (array) encoded column
+        wanted: (set) codes to look for
+        :return: dictionary of code to sorted positions
+    """
+    if not wanted:
+        return {}
+
+    if numpy is not None:
+        column = numpy.frombuffer(codes, dtype=f'i{codes.itemsize}')
+        positions = numpy.nonzero(numpy.isin(column, numpy.fromiter(wanted, dtype=numpy.int64)))[0]
+        found = column[positions]
+        # stable sort keeps positions of every code in ascending order
+        order = numpy.argsort(found, kind='stable')
+        found, positions = found[order], positions[order]
+        keys, starts = numpy.unique(found, return_index=True)
+        groups = numpy.split(positions, starts[1:])
+        return {int(key): group.tolist() for key, group in zip(keys, groups)}
+
+    groups = {}
+    for position, code in enumerate(codes):
+        if code in wanted:
+            groups.setdefault(code, []).append(position)
+    return groups
+
+
+class IntColumn(Column):
+    """Integers stored in a signed 64 bit array with a presence mask"""
+
+    def __init__(self, field, values) -> None:
+        super().__init__(field)
+        self.__values = array('q', (0 if v is None else v for v in values))
+        self.__present = bytearray(v is not None for v in values)
+
+    def value(self, position):
+        return self.__values[position] if self.__present[position] else None
+
+    def match(self, value):
+        if type(value) not in {int, bool}:
+            return []
+        values, present = self.__values, self.__present
+        return [i for i, v in enumerate(values) if v == value and present[i]]
+
+    def match_many(self, values):
+        wanted = {int(value) for value in values if type(value) in {int, bool} and -2 ** 63 <= value < 2 ** 63}
+        groups = group_codes(self.__values, wanted)
+        present = self.__present
+        groups = {code: [i for i in positions if present[i]] for code, positions in groups.items()}
+        return {value: groups[value] for value in values if groups.get(value) and type(value) is not str}
+
+
+class BoolColumn(Column):
+    """Booleans stored in a signed byte array (-1 when absent)"""
+
+    def __init__(self, field, values) -> None:
+        super().__init__(field)
+        self.__values = array('b', (ABSENT if v is None else int(v) for v in values))
+
+    def value(self, position):
+        found_value = self.__values[position]
+        return None if found_value == ABSENT else bool(found_value)
+
+    def match(self, value):
+        # True == 1 and False == 0, any other value never matches a boolean
+        if type(value) not in {int, bool} or value not in {0, 1}:
+            return []
+        code = int(value)
+        return [i for i, v in enumerate(self.__values) if v == code]
+
+    def match_many(self, values):
+        wanted = {int(value) for value in values if type(value) in {int, bool} and value in {0, 1}}
+        groups = group_codes(self.__values, wanted)
+        return {value: groups[value] for value in values if type(value) is not str and value in groups}
+
+
+class StrColumn(Column):
+    """Dictionary encoded strings, every distinct string is stored once"""
+
+    def __init__(self, field, values) -> None:
+        super().__init__(field)
+        self.__dictionary = []
+        self.__codes_by_value = {}
+        self.__codes = array('l', (self.encode(v) for v in values))
+
+    def encode(self, value):
+        """Return code of the string, adding it to the dictionary when new"""
+        if value is None:
+            return ABSENT
+        code = self.__codes_by_value.get(value)
+        if code is None:
+            code = self.__codes_by_value[value] = len(self.__dictionary)
+            self.__dictionary.append(value)
+        return code
+
+    def value(self, position):
+        code = self.__codes[position]
+        return None if code == ABSENT else self.__dictionary[code]
+
+    def match(self, value):
+        if type(value) is not str or value not in self.__codes_by_value:
+            return []
+        code = self.__codes_by_value[value]
+        return [i for i, c in enumerate(self.__codes) if c == code]
+
+    def match_many(self, values):
+        codes = {value: self.__codes_by_value[value] for value in values
+                 if type(value) is str and value in self.__codes_by_value}
+        groups = group_codes(self.__codes, set(codes.values()))
+        return {value: groups[code] for value, code in codes.items() if code in groups}
+
+
+class ListColumn(Column):
+    """
+        Lists stored as one flat column of elements plus an offsets array,
+        elements of row i are elements[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, field, values) -> None:
+        super().__init__(field)
+        self.__present = bytearray(v is not None for v in values)
+        offsets = array('q', [0])
+        flat = []
+        for found_value in values:
+            if found_value is not None:
+                flat.extend(found_value)
+            offsets.append(len(flat))
+        self.__offsets = offsets
+        self.__elements = build_column(field, flat, nested=True)
+
+    def value(self, position):
+        if not self.__present[position]:
+            return None
+        start, end = self.__offsets[position], self.__offsets[position + 1]
+        return [self.__elements.value(i) for i in range(start, end)]
+
+    def match(self, value):
+        positions = []
+        for element_position in self.__elements.match(value):
+            # map the element back to the row that owns it
+            position = bisect_right(self.__offsets, element_position) - 1
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        return positions
+
+    def match_many(self, values):
+        groups = self.__elements.match_many(values)
+        if numpy is not None and groups:
+            offsets = numpy.frombuffer(self.__offsets, dtype=numpy.int64)
+            return {
+                value: numpy.unique(numpy.searchsorted(offsets, element_positions, side='right') - 1).tolist()
+                for value, element_positions in groups.items()
+            }
+
+        result = {}
+        for value, element_positions in groups.items():
+            positions = result[value] = []
+            for element_position in element_positions:
+                position = bisect_right(self.__offsets, element_position) - 1
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+        return result
+
+
+class ObjectColumn(Column):
+    """Fallback column that keeps python objects of mixed or unsupported types"""
+
+    def __init__(self, field, values, nested=False) -> None:
+        super().__init__(field)
+        self.__values = list(values)
+        self.__nested = nested
+
+    def value(self, position):
+        return self.__values[position]
+
+    def match(self, value):
+        if self.__nested:
+            # elements of a list are compared like `value in list`
+            return [i for i, v in enumerate(self.__values) if v == value]
+        return [i for i, v in enumerate(self.__values) if JSONDB.exists({self.field: v}, self.field, value)]
+
+    def match_many(self, values):
+        wanted = set(values)
+        groups = {}
+        for position, found_value in enumerate(self.__values):
+            if self.__nested:
+                keys = [found_value] if not isinstance(found_value, (dict, list)) else []
+            elif type(found_value) in {str, int, bool}:
+                keys = [found_value]
+            elif isinstance(found_value, list):
+                keys = {v for v in found_value if v is not None and not isinstance(v, (dict, list))}
+            else:
+                keys = []
+            for key in keys:
+                if key in wanted:
+                    bucket = groups.setdefault(key, [])
+                    if not bucket or bucket[-1] != position:
+                        bucket.append(position)
+        return {value: groups[value] for value in values if value in groups}
+
+
+def build_column(field, values, nested=False):
+    """ Choose the most compact column able to store the values
+        field: (str) field name
+        values: (list) value of the field for every row, None when missing
+        nested: (bool) whether values are elements of list fields
+        :return: Column
+    """
+    types = {type(v) for v in values if v is not None}
+    if nested and None in values:
+        # null elements inside lists must be kept as they are
+        return ObjectColumn(field, values, nested)
+    if types == {int} and all(-2 ** 63 <= v < 2 ** 63 for v in values if v is not None):
+        return IntColumn(field, values)
+    if types == {bool}:
+        return BoolColumn(field, values)
+    if types == {str}:
+        return StrColumn(field, values)
+    if types == {list} and not nested:
+        return ListColumn(field, values)
+    return ObjectColumn(field, values, nested)
+
+
+class ColumnarDB(BaseDB):
+    """
+        This class stores JSON data column by column in typed arrays and
+        rebuilds dictionaries only for returned rows
+    """
+
+    def __init__(self) -> None:
+        self.__columns = {}
+        self.__schema = Schema()
+        self.__shapes = []
+        self.__row_shapes = array('l')
+
+    def add_data(self, data):
+        """ Store data in memory.
+            data: (list or str) data must be list or json path string that contains
+                   list of dictionaries ( or JSON objects)
+        """
+        if not isinstance(data, list):
+            data = JSONDB.convert_file_path_to_json(data)
+
+        self.process_data(data)
+
+    def process_data(self, data):
+        """ Validate received data and encode it into columns"""
+        assert isinstance(data, list), "data must be list type"
+        schema = Schema.infer(data)
+        fields = {}
+        shapes = {}
+        row_shapes = array('l')
+        for item in data:
+            # key order of each row is kept once per distinct shape
+            shape = tuple(item.keys())
+            row_shapes.append(shapes.setdefault(shape, len(shapes)))
+            fields.update(dict.fromkeys(shape))
+
+        self.__columns = {
+            field: build_column(field, [item.get(field) for item in data]) for field in fields
+        }
+        self.__schema = schema
+        self.__shapes = list(shapes)
+        self.__row_shapes = row_shapes
+
+    def row(self, position, fields=None):
+        """Rebuild dictionary of the row at position, with only the given fields when there are some"""
+        shape = self.__shapes[self.__row_shapes[position]]
+        if fields is not None:
+            shape = [field for field in fields if field in shape]
+        return {field: self.__columns[field].value(position) for field in shape}
+
+    def __match(self, field, value):
+        assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        return self.__columns[field].match(value)
+
+    def filter(self, field, value, fields=None):
+        """ Apply filtering
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            fields: (list) fields of returned items, only their columns are read
+            :return: result of filter
+        """
+        if fields is not None:
+            assert isinstance(fields, (list, tuple)), "fields must be list type"
+            for projected_field in fields:
+                if projected_field not in self.__schema:
+                    raise FieldNotFoundError()
+        return [self.row(position, fields) for position in self.__match(field, value)]
+
+    def filter_many(self, field, values):
+        """ Apply filtering for many values in one pass over the column
+            field: (str) field to apply filter based on it
+            values: (list of str, int, bool) values to apply filter based on them
+            :return: dictionary of value to result of filter
+        """
+        values = list(values)
+        for value in values:
+            assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        groups = self.__columns[field].match_many(values)
+        rows = {}
+        result = {}
+        for value in values:
+            result[value] = [rows[p] if p in rows else rows.setdefault(p, self.row(p)) for p in groups.get(value, [])]
+        return result
+
+    def fields(self):
+        """Return schema of fields (or columns), it's used like a set of field names"""
+        return self.__schema
+
+    def get(self, field, value):
+        """ Get first matched value
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            :return: dictionary
+        """
+        positions = self.__match(field, value)
+        return self.row(positions[0]) if positions else None
+
+    def __len__(self):
+        return len(self.__row_shapes)
@@ -0,0 +1,143 @@
+"""
+    Concurrency contract of the database package
+    * JSONDB reads (get, filter, query, search, between, fields, ...) share a read lock and
+      run concurrently, writes (add_data, insert, update, delete, compact) take the write
+      lock and wait for running reads, new reads wait for pending writes.
+    * rows are never changed in place, update replaces them, so a row returned to a reader
+      stays consistent after the lock is released.
+    * ColumnarDB and StreamingJSONDB are not changed after add_data, so reads are safe.
+    * Database swaps its db with one reference assignment (see SourceWatcher), queries that
+      already started keep using the db they started with.
+"""
+import multiprocessing, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+def process_context():
+    """ Start method of worker processes (parse processes of connect_all, scan processes of
+        ShardedScanner), they're started while other threads are running and forking a
+        multi-threaded process may copy locks held by those threads, so the forkserver
+        (or spawn where there is none) starts them from a single-threaded process
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class ReadWriteLock:
+    """
+        Lock that lets many readers or one writer in, writers are preferred so a steady
+        stream of reads can't starve them. A thread holding the read lock can take it again
+        (e.g. AsyncDatabase holds it around a lookup), the write lock isn't reentrant.
+    """
+
+    def __init__(self) -> None:
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = False
+        self.__waiting_writers = 0
+        # read locks held by the current thread
+        self.__held = threading.local()
+
+    def acquire_read(self, blocking=True):
+        """ Take the read lock
+            blocking: (bool) wait while a writer holds or waits for the lock, otherwise give up
+            :return: (bool) whether the lock was taken
+        """
+        held = getattr(self.__held, 'reads', 0)
+        with self.__condition:
+            # a nested read doesn't wait for writers, they wait for the outer read of this thread
+            while not held and (self.__writer or self.__waiting_writers):
+                if not blocking:
+                    return False
+                self.__condition.wait()
+            self.__readers += 1
+        self.__held.reads = held + 1
+        return True
+
+    def release_read(self):
+        self.__held.reads -= 1
+        with self.__condition:
+            self.__readers -= 1
+            if not self.__readers:
+                self.__condition.notify_all()
+
+    def acquire_write(self):
+        with self.__condition:
+            self.__waiting_writers += 1
+            while self.__writer or self.__readers:
+                self.__condition.wait()
+            self.__waiting_writers -= 1
+            self.__writer = True
+
+    def release_write(self):
+        with self.__condition:
+            self.__writer = False
+            self.__condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """Context manager holding the read lock"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """Context manager holding the write lock"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class QueryExecutor:
+    """
+        Runs get/filter (or any other Database method) on a thread pool and returns futures,
+        queries of the user, ticket and organization databases can be submitted together
+    """
+
+    def __init__(self, databases=None, max_workers=None) -> None:
+        """ databases: (dict) entity name to Database, so queries can name the entity
+            max_workers: (int) number of threads
+        """
+        self.__databases = databases or {}
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query')
+
+    def __database(self, database):
+        return self.__databases[database] if isinstance(database, str) else database
+
+    def submit(self, database, method, *args, **kwargs):
+        """ Run a method of a database in the pool
+            database: (Database or str) database or its entity name
+            method: (str) name of the method, e.g. 'filter'
+            :return: Future
+        """
+        return self.__pool.submit(getattr(self.__database(database), method), *args, **kwargs)
+
+    def get(self, database, field, value):
+        """Run get in the pool and return its future"""
+        return self.submit(database, 'get', field, value)
+
+    def filter(self, database, field, value):
+        """Run filter in the pool and return its future"""
+        return self.submit(database, 'filter', field, value)
+
+    def map(self, queries):
+        """ Run many queries
+            queries: (list) tuples of (database, method, *args)
+            :return: list of futures in the order of queries
+        """
+        return [self.submit(database, method, *args) for database, method, *args in queries]
+
+    def shutdown(self, wait=True):
+        self.__pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
@@ -0,0 +1,132 @@
+"""
+    Decoders that load a JSON file into python objects. The stdlib decoder is the default,
+    orjson is used when it's installed and asked for (by name or with 'auto').
+    Decoders created with intern=True also intern low-cardinality string values (e.g. status,
+    locale, timezone) after decoding, so rows share one string object per distinct value.
+    It saves memory of large files but costs an extra pass over every row, so it's off as default.
+"""
+import json
+from .exceptions import DataIsNotJSONError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class Decoder:
+    """
+        Base class of decoders, concrete decoders implement decode(raw bytes)
+        name: (str) name the decoder is registered with
+    """
+    name = None
+
+    def __init__(self, intern=False, max_distinct=256) -> None:
+        """ intern: (bool) share one object per distinct short string value of a field
+            max_distinct: (int) fields with more distinct values than this aren't interned
+        """
+        self.intern = intern
+        self.max_distinct = max_distinct
+
+    def decode(self, raw):
+        """ Decode bytes of a JSON document
+            raw: (bytes)
+            :return: decoded object, json.JSONDecodeError is raised for invalid documents
+        """
+        raise NotImplementedError()
+
+    def load(self, file_path):
+        """ Decode a JSON file, failures are reported as DataIsNotJSONError with their reason
+            file_path: (str) path of the json file
+            :return: decoded object
+        """
+        try:
+            with open(file_path, 'rb') as json_file:
+                raw = json_file.read()
+        except (OSError, TypeError, ValueError) as e:
+            raise DataIsNotJSONError(f'{file_path!r} can not be read: {e}')
+        try:
+            data = self.decode(raw)
+        except json.JSONDecodeError as e:
+            raise DataIsNotJSONError(
+                f'{file_path} is not valid JSON: {e.msg} at line {e.lineno} column {e.colno} (char {e.pos})')
+        except UnicodeDecodeError as e:
+            raise DataIsNotJSONError(f'{file_path} is not UTF-8 encoded: {e.reason} at byte {e.start}')
+        if self.intern and isinstance(data, list):
+            intern_values(data, self.max_distinct)
+        return data
+
+
+class StdlibDecoder(Decoder):
+    """Decoder of the json module, it already shares one object per distinct key"""
+    name = 'json'
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+class OrjsonDecoder(Decoder):
+    """Decoder of the orjson package, several times faster than the json module"""
+    name = 'orjson'
+
+    def __init__(self, intern=False, max_distinct=256) -> None:
+        assert orjson is not None, "orjson is not installed (pip install orjson)"
+        super().__init__(intern, max_distinct)
+
+    def decode(self, raw):
+        return orjson.loads(raw)
+
+
+DECODERS = {StdlibDecoder.name: StdlibDecoder, OrjsonDecoder.name: OrjsonDecoder}
+
+
+def available_decoders():
+    """Return names of decoders whose package is installed"""
+    return [name for name in DECODERS if name != OrjsonDecoder.name or orjson is not None]
+
+
+def get_decoder(decoder=None):
+    """ Return a decoder
+        decoder: (Decoder, str or None) a decoder, a name of DECODERS, 'auto' for the fastest
+                 installed one, or None for the stdlib one
+        :return: Decoder
+    """
+    if isinstance(decoder, Decoder):
+        return decoder
+    if decoder is None:
+        decoder = StdlibDecoder.name
+    if decoder == 'auto':
+        decoder = OrjsonDecoder.name if orjson is not None else StdlibDecoder.name
+    assert decoder in DECODERS, f"decoder must be one of {', '.join(DECODERS)} or 'auto'"
+    return DECODERS[decoder]()
+
+
+def intern_values(data, max_distinct=256, max_length=64):
+    """ Replace equal short strings of every field (and of its list values) by one shared object,
+        a field stops being interned once it has more than max_distinct values
+        data: (list) rows, rows that aren't dictionaries are skipped
+        :return: data
+    """
+    memos = {}
+    for item in data:
+        if type(item) is not dict:
+            continue
+        for field, value in item.items():
+            memo = memos.get(field)
+            if memo is None:
+                memo = memos[field] = {}
+            elif memo is False:
+                # high-cardinality field
+                continue
+            if type(value) is str:
+                if len(value) <= max_length:
+                    item[field] = memo.setdefault(value, value)
+            elif type(value) is list:
+                value[:] = [memo.setdefault(element, element)
+                            if type(element) is str and len(element) <= max_length else element
+                            for element in value]
+            else:
+                continue
+            if len(memo) > max_distinct:
+                memos[field] = False
+    return data
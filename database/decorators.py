@@ -1,14 +1,63 @@
+import inspect
 from functools import wraps
 from .exceptions import DatabaseIsNotConnectedError
 
 
 def required_connection(func):
-    """ Decorator function to make sure that db is connected and source is defined"""
+    """ Decorator function to make sure that db is connected and source is defined,
+        coroutines and async generators raise when they are awaited or iterated,
+        calls of an instrumented object (see database.instrumentation) are timed
+    """
 
-    @wraps(func)
-    def db_must_be_connected(*args, **kwargs):
+    def check_connection(args):
         if (len(args) <= 0) or (not args[0].is_db_connected()):
             raise DatabaseIsNotConnectedError()
-        return func(*args, **kwargs)
+
+    if inspect.isasyncgenfunction(func):
+        @wraps(func)
+        async def db_must_be_connected(*args, **kwargs):
+            check_connection(args)
+            async for item in func(*args, **kwargs):
+                yield item
+
+        return db_must_be_connected
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def db_must_be_connected(*args, **kwargs):
+            check_connection(args)
+            return await func(*args, **kwargs)
+
+        return db_must_be_connected
+
+    @wraps(func)
+    def db_must_be_connected(*args, **kwargs):
+        check_connection(args)
+        instrumentation = getattr(args[0], 'instrumentation', None)
+        if instrumentation is None:
+            return func(*args, **kwargs)
+        return instrumentation.call(func.__name__, func, args, kwargs)
 
     return db_must_be_connected
+
+
+def read_locked(func):
+    """ Decorator function to run a method under the read lock of its db (self.lock)"""
+
+    @wraps(func)
+    def under_read_lock(self, *args, **kwargs):
+        with self.lock.read():
+            return func(self, *args, **kwargs)
+
+    return under_read_lock
+
+
+def write_locked(func):
+    """ Decorator function to run a method under the write lock of its db (self.lock)"""
+
+    @wraps(func)
+    def under_write_lock(self, *args, **kwargs):
+        with self.lock.write():
+            return func(self, *args, **kwargs)
+
+    return under_write_lock
@@ -29,3 +29,17 @@ class DatabaseIsNotConnectedError(Error):
 
     def __init__(self, message='database is not connected') -> None:
         super().__init__(message)
+
+
+class DatabaseIsReloadedError(Error):
+    """This exception is thrown when a db is written after a reloaded db took its place"""
+
+    def __init__(self, message='database was reloaded, write to the reloaded one') -> None:
+        super().__init__(message)
+
+
+class QueryIsInvalidError(Error):
+    """This exception is thrown when a query expression can't be parsed"""
+
+    def __init__(self, message='query is not valid') -> None:
+        super().__init__(message)
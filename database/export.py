@@ -0,0 +1,249 @@
+"""
+    Projection of rows to some of their fields and bulk export of rows to
+    JSON Lines, CSV or a columnar binary file. Rows are written while they are read,
+    so an export never holds more than one block of the result.
+
+    Layout of columnar files, all integers are little endian:
+    * header: 8 bytes magic 'JSONDBC1', uint64 size of the JSON array of field names, the array
+    * blocks until the end of the file: uint64 number of rows, then one column per field
+    * column: 1 byte kind, uint64 size of the null mask, uint64 size of the payload, the null mask
+      (one byte per row, 1 for null, empty when the column has no nulls) and the payload of the
+      not null values:
+      'b' bool: one byte per value
+      'i' int: int64 per value
+      'f' float: float64 per value
+      's' str: uint32 number of distinct strings, texts of them, uint32 dictionary code per value
+      'j' anything else (lists, objects, mixed types): texts of the JSON of every value
+    * texts: uint32 byte length of every text, then the UTF-8 bytes of all of them
+"""
+import csv, json, struct, sys
+from array import array
+from .exceptions import DataIsInvalidError
+
+JSONL = 'jsonl'
+CSV = 'csv'
+COLUMNAR = 'columnar'
+FORMATS = (JSONL, CSV, COLUMNAR)
+
+MAGIC = b'JSONDBC1'
+HEADER = struct.Struct('<8sQ')
+BLOCK = struct.Struct('<Q')
+COLUMN = struct.Struct('<cQQ')
+
+# kinds of columns
+BOOL = b'b'
+INT = b'i'
+FLOAT = b'f'
+STR = b's'
+JSON = b'j'
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# compact separators, non-ascii characters are written as they are
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def project(item, fields):
+    """ Return the item with only the given fields, missing fields stay missing
+        item: (dict) the row
+        fields: (list) wanted fields
+        :return: dictionary
+    """
+    return {field: item[field] for field in fields if field in item}
+
+
+def write_jsonl(rows, file, fields=None):
+    """ Write one JSON object per line
+        rows: (iterable) dictionaries
+        file: text file
+        fields: (list) fields of every line, None for whole rows
+        :return: (int) number of written rows
+    """
+    count = 0
+    lines = []
+    for item in rows:
+        lines.append(_encode(item if fields is None else project(item, fields)))
+        if len(lines) == 1000:
+            count += len(lines)
+            file.write('\n'.join(lines) + '\n')
+            lines.clear()
+    if lines:
+        count += len(lines)
+        file.write('\n'.join(lines) + '\n')
+    return count
+
+
+def write_csv(rows, file, fields):
+    """ Write a header of the fields and one line per row, list and object values are
+        written as JSON and missing values as empty cells
+        rows: (iterable) dictionaries
+        file: text file opened with newline=''
+        fields: (list) columns
+        :return: (int) number of written rows
+    """
+    writer = csv.writer(file)
+    writer.writerow(fields)
+    count = 0
+    for item in rows:
+        writer.writerow([_encode(value) if type(value) in (list, dict) else value for value in map(item.get, fields)])
+        count += 1
+    return count
+
+
+def write_columnar(rows, file, fields, block_rows=8192):
+    """ Write rows as blocks of typed columns, see the layout at the top of the module,
+        missing values are written as nulls
+        rows: (iterable) dictionaries
+        file: binary file
+        fields: (list) columns
+        block_rows: (int) number of rows per block
+        :return: (int) number of written rows
+    """
+    header = json.dumps(list(fields)).encode()
+    file.write(HEADER.pack(MAGIC, len(header)))
+    file.write(header)
+    count = 0
+    columns = [[] for _ in fields]
+    getters = [(column.append, field) for column, field in zip(columns, fields)]
+    for item in rows:
+        get = item.get
+        for append, field in getters:
+            append(get(field))
+        count += 1
+        if count % block_rows == 0:
+            _write_block(file, columns)
+    if columns and columns[0]:
+        _write_block(file, columns)
+    return count
+
+
+def _write_block(file, columns):
+    file.write(BLOCK.pack(len(columns[0])))
+    for column in columns:
+        kind, nulls, payload = _encode_column(column)
+        file.write(COLUMN.pack(kind, len(nulls), len(payload)))
+        file.write(nulls)
+        file.write(payload)
+        column.clear()
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, raw):
+    unpacked = array(typecode)
+    unpacked.frombytes(raw)
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked
+
+
+def _pack_texts(texts):
+    encoded = [text.encode() for text in texts]
+    return _pack('I', map(len, encoded)) + b''.join(encoded)
+
+
+def _unpack_texts(raw, count):
+    lengths = _unpack('I', raw[:4 * count])
+    texts = []
+    offset = 4 * count
+    for length in lengths:
+        texts.append(raw[offset:offset + length].decode())
+        offset += length
+    return texts, offset
+
+
+def _encode_column(values):
+    """Return kind, null mask (empty without nulls) and payload of a column of a block"""
+    nulls = b''
+    if None in values:
+        nulls = bytes(value is None for value in values)
+        values = [value for value in values if value is not None]
+    types = set(map(type, values))
+    if types == {bool}:
+        return BOOL, nulls, bytes(values)
+    if types == {int} and INT64_MIN <= min(values) and max(values) <= INT64_MAX:
+        return INT, nulls, _pack('q', values)
+    if types == {float}:
+        return FLOAT, nulls, _pack('d', values)
+    if types == {str}:
+        # dictionary of distinct strings and one code per value
+        codes = {}
+        for value in values:
+            codes.setdefault(value, len(codes))
+        return STR, nulls, _pack('I', [len(codes)]) + _pack_texts(codes) + _pack('I', map(codes.__getitem__, values))
+    return JSON, nulls, _pack_texts(map(_encode, values))
+
+
+def _decode_column(kind, nulls, payload, rows):
+    count = rows - sum(nulls)
+    if kind == BOOL:
+        values = [byte == 1 for byte in payload]
+    elif kind == INT:
+        values = _unpack('q', payload).tolist()
+    elif kind == FLOAT:
+        values = _unpack('d', payload).tolist()
+    elif kind == STR:
+        distinct, offset = _unpack_texts(payload[4:], _unpack('I', payload[:4])[0])
+        values = [distinct[code] for code in _unpack('I', payload[4 + offset:])]
+    elif kind == JSON:
+        values = [json.loads(text) for text in _unpack_texts(payload, count)[0]]
+    else:
+        raise DataIsInvalidError(f'unknown column kind {kind!r}')
+    if not nulls:
+        return values
+    values = iter(values)
+    return [None if null else next(values) for null in nulls]
+
+
+def read_columnar(file):
+    """ Read blocks of a columnar export, values are decoded by their column kind, no code of
+        the file is run
+        file: binary file or path of a file written by write_columnar
+        :return: generator of dictionaries of field to list of values, one per block
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as columnar_file:
+            yield from read_columnar(columnar_file)
+        return
+
+    magic, header_size = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise DataIsInvalidError('file is not a columnar export')
+    fields = json.loads(file.read(header_size))
+    while True:
+        size = file.read(BLOCK.size)
+        if not size:
+            return
+        rows, = BLOCK.unpack(size)
+        block = {}
+        for field in fields:
+            kind, nulls_size, payload_size = COLUMN.unpack(file.read(COLUMN.size))
+            nulls = file.read(nulls_size)
+            block[field] = _decode_column(kind, nulls, file.read(payload_size), rows)
+        yield block
+
+
+WRITERS = {JSONL: write_jsonl, CSV: write_csv, COLUMNAR: write_columnar}
+
+
+def export(rows, target, format=JSONL, fields=None):
+    """ Write rows to a file in one of FORMATS
+        rows: (iterable) dictionaries, e.g. a generator reading them from storage
+        target: (str or file) path, or file opened in text mode (binary mode for columnar)
+        format: (str) 'jsonl', 'csv' or 'columnar'
+        fields: (list) exported fields, required by csv and columnar
+        :return: (int) number of written rows
+    """
+    assert format in FORMATS, "format must be jsonl, csv or columnar"
+    assert fields is not None or format == JSONL, "csv and columnar exports need fields"
+    if not isinstance(target, str):
+        return WRITERS[format](rows, target, fields)
+    if format == COLUMNAR:
+        with open(target, 'wb') as file:
+            return write_columnar(rows, file, fields)
+    with open(target, 'w', newline='', encoding='utf-8') as file:
+        return WRITERS[format](rows, file, fields)
@@ -0,0 +1,165 @@
+import math, re, sys
+from heapq import nlargest
+
+TEXT_FIELDS = ('subject', 'description', 'signature', 'name', 'details')
+
+WORD_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# offset gap between fields, so a phrase never matches across two fields
+FIELD_GAP = 1
+
+
+def tokenize(text):
+    """Split text into case folded words"""
+    return [word.casefold() for word in WORD_PATTERN.findall(text)]
+
+
+def parse_search(text):
+    """ Split search text into single terms and quoted phrases
+        text: (str) e.g. 'korea "a catastrophe"'
+        :return: tuple of (list of terms, list of phrases as lists of terms)
+    """
+    terms, phrases = [], []
+    for phrase, words in QUERY_PATTERN.findall(text):
+        if phrase:
+            phrase_terms = tokenize(phrase)
+            if len(phrase_terms) == 1:
+                terms.extend(phrase_terms)
+            elif phrase_terms:
+                phrases.append(phrase_terms)
+        else:
+            terms.extend(tokenize(words))
+    return terms, phrases
+
+
+class FullTextIndex:
+    """
+        Tokenized inverted index over text fields, postings keep word offsets of every row
+        so phrases can be matched, results are ranked with BM25
+    """
+
+    def __init__(self, fields, k1=1.2, b=0.75) -> None:
+        self.fields = tuple(fields)
+        self.k1 = k1
+        self.b = b
+        self.__postings = {}
+        self.__lengths = {}
+        self.__total_length = 0
+
+    @classmethod
+    def build(cls, fields, data):
+        """ Build index of the text fields over all rows of data
+            fields: (list) text fields to index
+            data: (list) list of dictionaries
+            :return: FullTextIndex
+        """
+        index = cls(fields)
+        for position, item in enumerate(data):
+            # deleted rows are kept as None so positions stay stable
+            if item is not None:
+                index.add(position, item)
+        return index
+
+    def __words(self, item):
+        offset = 0
+        for field in self.fields:
+            text = item.get(field)
+            if not isinstance(text, str):
+                continue
+            words = tokenize(text)
+            yield from enumerate(words, offset)
+            offset += len(words) + FIELD_GAP
+
+    def add(self, position, item):
+        """ Add row to the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row itself
+        """
+        length = 0
+        for offset, word in self.__words(item):
+            self.__postings.setdefault(word, {}).setdefault(position, []).append(offset)
+            length += 1
+        if length:
+            self.__lengths[position] = length
+            self.__total_length += length
+
+    def remove(self, position, item):
+        """ Remove row from the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row as it was added
+        """
+        for _, word in self.__words(item):
+            posting = self.__postings.get(word)
+            if posting is not None and posting.pop(position, None) is not None and not posting:
+                del self.__postings[word]
+        self.__total_length -= self.__lengths.pop(position, 0)
+
+    def search(self, text, limit=10):
+        """ Rank rows matching the search text
+            text: (str) terms and quoted phrases, rows must contain every phrase and
+                  at least one of the terms
+            limit: (int) number of returned rows
+            :return: list of (score, position) ordered by descending score
+        """
+        terms, phrases = parse_search(text)
+        if not terms and not phrases:
+            return []
+
+        candidates = None
+        for phrase in phrases:
+            matched = self.__phrase_positions(phrase)
+            candidates = matched if candidates is None else candidates & matched
+        if terms:
+            with_terms = set()
+            for term in terms:
+                with_terms.update(self.__postings.get(term, ()))
+            candidates = with_terms if candidates is None else candidates & with_terms
+
+        scoring_terms = terms + [term for phrase in phrases for term in phrase]
+        scores = ((self.__score(position, scoring_terms), position) for position in candidates)
+        return nlargest(limit, scores, key=lambda pair: (pair[0], -pair[1]))
+
+    def __phrase_positions(self, phrase):
+        postings = [self.__postings.get(term, {}) for term in phrase]
+        # start from the rarest term of the phrase
+        candidates = set(min(postings, key=len))
+        for posting in postings:
+            candidates &= posting.keys()
+        matched = set()
+        for position in candidates:
+            starts = set(postings[0][position])
+            for shift, posting in enumerate(postings[1:], 1):
+                starts &= {offset - shift for offset in posting[position]}
+            if starts:
+                matched.add(position)
+        return matched
+
+    def __score(self, position, terms):
+        rows = len(self.__lengths)
+        average_length = self.__total_length / rows
+        length = self.__lengths[position]
+        score = 0.0
+        for term in terms:
+            posting = self.__postings.get(term, {})
+            frequency = len(posting.get(position, ()))
+            if not frequency:
+                continue
+            idf = math.log(1 + (rows - len(posting) + 0.5) / (len(posting) + 0.5))
+            score += idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * (1 - self.b + self.b * length / average_length))
+        return score
+
+    def stats(self):
+        """ Return size information of the index
+            :return: dictionary with number of terms, postings and memory in bytes
+        """
+        entries = 0
+        memory = sys.getsizeof(self.__postings) + sys.getsizeof(self.__lengths)
+        for posting in self.__postings.values():
+            entries += len(posting)
+            memory += sys.getsizeof(posting) + sum(sys.getsizeof(offsets) for offsets in posting.values())
+        return {'keys': len(self.__postings), 'entries': entries, 'memory': memory}
+
+    def __len__(self):
+        return len(self.__postings)
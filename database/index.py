@@ -0,0 +1,352 @@
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+SCALAR_TYPES = {str, int, bool}
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S %z'
+
+# index building modes
+EAGER = 'eager'
+LAZY = 'lazy'
+OFF = 'off'
+
+
+def value_matches(found_value, value):
+    """ Condition of JSONDB.exists applied to an already found value
+        found_value: value stored in a row
+        value: (str, int, bool) searched value
+        :return: (bool)
+    """
+    if found_value is None:
+        return False
+    if type(found_value) in SCALAR_TYPES:
+        return found_value == value
+    if isinstance(found_value, list):
+        return value in found_value
+    return False
+
+
+def index_keys(item, field):
+    """ Return the keys a row is reachable by, following JSONDB.exists rules
+        item: (dict) the row
+        field: (str) indexed field
+        :return: list of hashable values
+    """
+    found_value = item.get(field)
+    if found_value is None:
+        return []
+
+    if type(found_value) in SCALAR_TYPES:
+        return [found_value]
+
+    if isinstance(found_value, list):
+        keys = []
+        for element in found_value:
+            # unhashable elements (dicts, lists) can never equal a str, int or bool
+            if element is None or isinstance(element, (dict, list)):
+                continue
+            keys.append(element)
+        return keys
+
+    return []
+
+
+class IndexPolicy:
+    """
+        Decides when the index of each field is built
+        * eager: built while data is processed
+        * lazy: built the first time the field is queried, then reused
+        * off: never built, queries scan the whole dataset
+    """
+
+    def __init__(self, default=LAZY, eager=(), lazy=(), off=(), ranged=(), text=None, lookup=()) -> None:
+        """ ranged: fields whose sorted range index is built while data is processed,
+                    range indexes of other fields are built on their first range query
+            text: text fields whose full-text index is built while data is processed,
+                  otherwise it's built on the first search
+            lookup: fields whose prefix, case-insensitive and fuzzy lookup index is built
+                    while data is processed, otherwise it's built on the first typeahead query
+        """
+        assert default in {EAGER, LAZY, OFF}, "default must be eager, lazy or off"
+        self.default = default
+        self.ranged = set(ranged)
+        self.text = tuple(text) if text is not None else None
+        self.lookup = set(lookup)
+        self.__modes = {}
+        for mode, fields in ((EAGER, eager), (LAZY, lazy), (OFF, off)):
+            for field in fields:
+                self.__modes[field] = mode
+
+    def mode(self, field):
+        """Return building mode of the field"""
+        return self.__modes.get(field, self.default)
+
+    def eager_fields(self, fields):
+        """Return fields (among the given ones) that must be indexed up front"""
+        return {field for field in fields if self.mode(field) == EAGER}
+
+
+class HashIndex:
+    """
+        Inverted index that maps every value of a field to the sorted list of
+        row positions that hold it. List values are expanded, so each element
+        gets its own entry.
+    """
+
+    def __init__(self, field) -> None:
+        self.field = field
+        self.__buckets = {}
+
+    @classmethod
+    def build(cls, field, data):
+        """ Build index of the field over all rows of data
+            field: (str) field to index
+            data: (list) list of dictionaries
+            :return: HashIndex
+        """
+        index = cls(field)
+        for position, item in enumerate(data):
+            # deleted rows are kept as None so positions stay stable
+            if item is not None:
+                index.add(position, item)
+        return index
+
+    def add(self, position, item):
+        """ Add row to the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row itself
+        """
+        for key in self.keys_of(item):
+            bucket = self.__buckets.setdefault(key, [])
+            if not bucket or bucket[-1] < position:
+                bucket.append(position)
+            else:
+                # a row updated in place, or a list containing the same element twice
+                i = bisect_left(bucket, position)
+                if i == len(bucket) or bucket[i] != position:
+                    bucket.insert(i, position)
+
+    def remove(self, position, item):
+        """ Remove row from the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row as it was added
+        """
+        for key in self.keys_of(item):
+            bucket = self.__buckets.get(key)
+            if not bucket:
+                continue
+            i = bisect_left(bucket, position)
+            if i < len(bucket) and bucket[i] == position:
+                del bucket[i]
+            if not bucket:
+                del self.__buckets[key]
+
+    def keys_of(self, item):
+        """ Return the keys the row is reachable by, see index_keys
+            item: (dict) the row
+            :return: list of hashable values
+        """
+        return index_keys(item, self.field)
+
+    def lookup(self, value):
+        """ Return sorted positions of rows that contain the value
+            value: (str, int, bool)
+            :return: list of positions
+        """
+        return self.__buckets.get(value, [])
+
+    def stats(self):
+        """ Return size information of the index
+            :return: dictionary with number of keys, stored positions and memory in bytes
+        """
+        entries = 0
+        memory = sys.getsizeof(self.__buckets)
+        for bucket in self.__buckets.values():
+            entries += len(bucket)
+            memory += sys.getsizeof(bucket)
+        return {'keys': len(self.__buckets), 'entries': entries, 'memory': memory}
+
+    def counts(self):
+        """Return number of rows per key"""
+        return {key: len(bucket) for key, bucket in self.__buckets.items()}
+
+    def __len__(self):
+        return len(self.__buckets)
+
+
+class CountIndex:
+    """
+        Materialized number of rows per value of a field, writes keep it up to date
+        like the other indexes, so group-by queries cost O(number of values).
+        A row counts once per distinct element of a list value.
+    """
+
+    def __init__(self, field) -> None:
+        self.field = field
+        self.__counts = {}
+
+    @classmethod
+    def build(cls, field, data):
+        """ Count rows of data per value of the field
+            field: (str) counted field
+            data: (list) list of dictionaries, None rows (deleted) are skipped
+            :return: CountIndex
+        """
+        index = cls(field)
+        counts = index.__counts
+        for item in data:
+            if item is not None:
+                for key in dict.fromkeys(index_keys(item, field)):
+                    counts[key] = counts.get(key, 0) + 1
+        return index
+
+    def add(self, position, item):
+        for key in dict.fromkeys(index_keys(item, self.field)):
+            self.__counts[key] = self.__counts.get(key, 0) + 1
+
+    def remove(self, position, item):
+        for key in dict.fromkeys(index_keys(item, self.field)):
+            count = self.__counts.get(key, 0) - 1
+            if count > 0:
+                self.__counts[key] = count
+            else:
+                self.__counts.pop(key, None)
+
+    def counts(self):
+        """Return number of rows per key"""
+        return dict(self.__counts)
+
+    def stats(self):
+        """ Return size information of the index
+            :return: dictionary with number of keys, counted rows and memory in bytes
+        """
+        return {'keys': len(self.__counts), 'entries': sum(self.__counts.values()),
+                'memory': sys.getsizeof(self.__counts)}
+
+    def __len__(self):
+        return len(self.__counts)
+
+
+def parse_timestamp(value):
+    """ Normalize a timestamp to epoch seconds
+        value: (str, datetime, int, float) e.g. "2016-04-28T11:19:34 -10:00", naive times are UTC
+        :return: (float) epoch seconds or None when value is not a timestamp
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+        except ValueError:
+            try:
+                value = datetime.fromisoformat(value.replace(' ', ''))
+            except ValueError:
+                return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class SortedIndex:
+    """
+        Range index that keeps rows sorted by the epoch value of a timestamp field,
+        range queries cost O(log n + k)
+    """
+
+    def __init__(self, field) -> None:
+        self.field = field
+        self.__keys = []
+        self.__positions = []
+
+    @classmethod
+    def build(cls, field, data):
+        """ Build index of the field over all rows of data
+            field: (str) field to index
+            data: (list) list of dictionaries
+            :return: SortedIndex
+        """
+        index = cls(field)
+        pairs = []
+        for position, item in enumerate(data):
+            key = index.key_of(item)
+            if key is not None:
+                pairs.append((key, position))
+        pairs.sort()
+        index.__keys = [key for key, _ in pairs]
+        index.__positions = [position for _, position in pairs]
+        return index
+
+    def key_of(self, item):
+        """Return epoch of the row or None when it has no timestamp"""
+        found_value = item.get(self.field) if item is not None else None
+        return parse_timestamp(found_value) if type(found_value) is str else None
+
+    def add(self, position, item):
+        """ Add row to the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row itself
+        """
+        key = self.key_of(item)
+        if key is None:
+            return
+        low, high = bisect_left(self.__keys, key), bisect_right(self.__keys, key)
+        i = low + bisect_left(self.__positions[low:high], position)
+        self.__keys.insert(i, key)
+        self.__positions.insert(i, position)
+
+    def remove(self, position, item):
+        """ Remove row from the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row as it was added
+        """
+        key = self.key_of(item)
+        if key is None:
+            return
+        low, high = bisect_left(self.__keys, key), bisect_right(self.__keys, key)
+        i = low + bisect_left(self.__positions[low:high], position)
+        if i < high and self.__positions[i] == position:
+            del self.__keys[i]
+            del self.__positions[i]
+
+    def range(self, start=None, end=None, include_start=True, include_end=True):
+        """ Return positions of rows between start and end ordered by time
+            start: (str, datetime, int, float) lower bound or None for no bound
+            end: (str, datetime, int, float) upper bound or None for no bound
+            :return: list of positions
+        """
+        low, high = 0, len(self.__keys)
+        if start is not None:
+            start = self.__bound(start)
+            low = bisect_left(self.__keys, start) if include_start else bisect_right(self.__keys, start)
+        if end is not None:
+            end = self.__bound(end)
+            high = bisect_right(self.__keys, end) if include_end else bisect_left(self.__keys, end)
+        return self.__positions[low:high]
+
+    def bounds(self):
+        """Return positions of the earliest and the latest rows, None when no row has a timestamp"""
+        if not self.__positions:
+            return None
+        return self.__positions[0], self.__positions[-1]
+
+    @staticmethod
+    def __bound(value):
+        key = parse_timestamp(value)
+        assert key is not None, "bound must be a timestamp string, datetime or epoch seconds"
+        return key
+
+    def stats(self):
+        """ Return size information of the index
+            :return: dictionary with number of keys, stored positions and memory in bytes
+        """
+        # every key is a float object of its own
+        memory = sys.getsizeof(self.__keys) + sys.getsizeof(self.__positions) + sys.getsizeof(0.0) * len(self.__keys)
+        return {'keys': len(self.__keys), 'entries': len(self.__positions), 'memory': memory}
+
+    def __len__(self):
+        return len(self.__keys)
@@ -0,0 +1,186 @@
+"""
+    Opt-in metrics of database operations: latency histograms of Database methods,
+    rows scanned and returned by JSONDB queries, cache and index hit rates and a log
+    of slow queries, optionally profiled with cProfile. Databases without an
+    Instrumentation only check one attribute per call.
+"""
+import cProfile, io, json, pstats, threading, time
+from collections import deque
+
+# upper bounds (seconds) of latency histogram buckets
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """
+        Cumulative histogram with fixed buckets, as exported by Prometheus
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Return list of (upper bound, number of samples lower or equal), the last bound is inf"""
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Return upper bound of the bucket holding the q quantile, None without samples"""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+
+
+class Instrumentation:
+    """
+        Collects metrics of the databases it's given to, e.g.
+        Database(instrumentation=Instrumentation(slow_threshold=0.05, profile=True))
+    """
+
+    def __init__(self, slow_threshold=None, profile=False, on_slow=None, slow_log_size=100) -> None:
+        """ slow_threshold: (float) seconds after which an operation is logged as slow, None to log none
+            profile: (bool) run operations under cProfile and keep the profile of slow ones
+            on_slow: (callable) called with the slow query record, e.g. to send it to a log
+            slow_log_size: (int) number of kept slow query records
+        """
+        self.slow_threshold = slow_threshold
+        self.profile = profile
+        self.on_slow = on_slow
+        self.latency = {}
+        self.rows_scanned = {}
+        self.rows_returned = {}
+        self.lookups = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.__lock = threading.Lock()
+
+    def call(self, operation, func, args, kwargs):
+        """Run an operation and record its latency"""
+        profiler = self.__start_profiler() if self.profile else None
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            self.observe(operation, seconds)
+            if self.slow_threshold is not None and seconds >= self.slow_threshold:
+                self.__slow(operation, seconds, args[1:], kwargs, profiler)
+
+    @staticmethod
+    def __start_profiler():
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active, e.g. an operation called by a profiled one
+            return None
+        return profiler
+
+    def __slow(self, operation, seconds, args, kwargs, profiler):
+        record = {'operation': operation, 'seconds': seconds, 'arguments': repr((args, kwargs))[:200]}
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(20)
+            record['profile'] = output.getvalue()
+        self.slow_queries.append(record)
+        if self.on_slow is not None:
+            self.on_slow(record)
+
+    def observe(self, operation, seconds):
+        """Record latency of an operation, e.g. parsing or validation of loaded data"""
+        with self.__lock:
+            histogram = self.latency.get(operation)
+            if histogram is None:
+                histogram = self.latency[operation] = Histogram()
+            histogram.observe(seconds)
+
+    def rows(self, operation, scanned, returned):
+        """Record rows a query read and rows it returned"""
+        with self.__lock:
+            self.rows_scanned[operation] = self.rows_scanned.get(operation, 0) + scanned
+            self.rows_returned[operation] = self.rows_returned.get(operation, 0) + returned
+
+    def lookup(self, kind, hit):
+        """ Record a lookup of a cache or an index
+            kind: (str) 'cache' or 'index'
+            hit: (bool) whether it answered the query
+        """
+        key = (kind, 'hit' if hit else 'miss')
+        with self.__lock:
+            self.lookups[key] = self.lookups.get(key, 0) + 1
+
+    def hit_rate(self, kind):
+        hits, misses = self.lookups.get((kind, 'hit'), 0), self.lookups.get((kind, 'miss'), 0)
+        return hits / (hits + misses) if hits + misses else None
+
+    def metrics(self):
+        """Return all metrics as a JSON serializable dictionary"""
+        with self.__lock:
+            return {
+                'operations': {
+                    operation: {
+                        'count': histogram.count,
+                        'seconds': histogram.sum,
+                        'p50_le': histogram.quantile(0.5),
+                        'p99_le': histogram.quantile(0.99),
+                        'buckets': {str(bound): total for bound, total in histogram.cumulative()},
+                    }
+                    for operation, histogram in self.latency.items()
+                },
+                'rows': {
+                    operation: {'scanned': scanned, 'returned': self.rows_returned.get(operation, 0)}
+                    for operation, scanned in self.rows_scanned.items()
+                },
+                'hit_rates': {kind: self.hit_rate(kind) for kind in sorted({kind for kind, _ in self.lookups})},
+                'slow_queries': [
+                    {key: value for key, value in record.items() if key != 'profile'} for record in self.slow_queries
+                ],
+            }
+
+    def to_json(self):
+        return json.dumps(self.metrics(), indent=2)
+
+    def to_prometheus(self, prefix='jsondb'):
+        """Return metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.__lock:
+            lines += [f'# HELP {prefix}_operation_seconds Latency of database operations',
+                      f'# TYPE {prefix}_operation_seconds histogram']
+            for operation, histogram in sorted(self.latency.items()):
+                for bound, total in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_operation_seconds_bucket{{operation="{operation}",le="{le}"}} {total}')
+                lines.append(f'{prefix}_operation_seconds_sum{{operation="{operation}"}} {histogram.sum}')
+                lines.append(f'{prefix}_operation_seconds_count{{operation="{operation}"}} {histogram.count}')
+            for name, counters in [('rows_scanned', self.rows_scanned), ('rows_returned', self.rows_returned)]:
+                lines += [f'# HELP {prefix}_{name}_total Rows {name.split("_")[1]} by queries',
+                          f'# TYPE {prefix}_{name}_total counter']
+                for operation, total in sorted(counters.items()):
+                    lines.append(f'{prefix}_{name}_total{{operation="{operation}"}} {total}')
+            lines += [f'# HELP {prefix}_lookups_total Cache and index lookups',
+                      f'# TYPE {prefix}_lookups_total counter']
+            for (kind, result), total in sorted(self.lookups.items()):
+                lines.append(f'{prefix}_lookups_total{{kind="{kind}",result="{result}"}} {total}')
+            lines += [f'# HELP {prefix}_slow_queries Slow queries in the log',
+                      f'# TYPE {prefix}_slow_queries gauge',
+                      f'{prefix}_slow_queries {len(self.slow_queries)}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,62 @@
+import os, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .concurrency import process_context
+from .source import Database
+
+THREADS = 'threads'
+PROCESSES = 'processes'
+AUTO = 'auto'
+
+
+def _load_state(source, options):
+    """Process task: load a source and return the state of its db"""
+    return Database().connect(source, **options).db.snapshot_state()
+
+
+def _uses_process(source, mode, process_threshold):
+    if not isinstance(source, str) or mode == THREADS:
+        return False
+    if mode == PROCESSES:
+        return True
+    try:
+        return os.path.getsize(source) >= process_threshold
+    except OSError:
+        # the thread reports the error of the missing file
+        return False
+
+
+def connect_all(sources, mode=AUTO, process_threshold=8 * 1024 * 1024, cache=None, instrumentation=None,
+                **options):
+    """ Connect one Database per source concurrently, sources are loaded and indexed in threads,
+        parse-heavy files are parsed in processes and their state is sent back to be restored
+        sources: (dict) name to source, e.g. constants.entities
+        mode: (str) 'threads', 'processes' or 'auto' (processes for files of process_threshold bytes or more)
+        process_threshold: (int) file size in bytes from which 'auto' parses in a process
+        cache: (QueryCache) cache shared by the databases
+        instrumentation: (Instrumentation) instrumentation shared by the databases
+        options: arguments of Database.connect (index_policy, snapshot, decoder) for the default JSONDB
+        :return: dictionary of name to connected Database, load_seconds of each tells its load time
+    """
+    assert mode in {THREADS, PROCESSES, AUTO}, "mode must be 'threads', 'processes' or 'auto'"
+    assert 'db' not in options, "connect_all loads the default JSONDB"
+    heavy = [name for name, source in sources.items() if _uses_process(source, mode, process_threshold)]
+    processes = ProcessPoolExecutor(max_workers=len(heavy), mp_context=process_context()) if heavy else None
+
+    def connect(name):
+        start = time.perf_counter()
+        database = Database(cache=cache, instrumentation=instrumentation)
+        if name in heavy:
+            state = processes.submit(_load_state, sources[name], options).result()
+            database.connect(sources[name], state=state, **options)
+        else:
+            database.connect(sources[name], **options)
+        database.load_seconds = time.perf_counter() - start
+        return database
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(sources)), thread_name_prefix='connect') as threads:
+            futures = {name: threads.submit(connect, name) for name in sources}
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        if processes is not None:
+            processes.shutdown()
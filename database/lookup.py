@@ -0,0 +1,267 @@
+import re, sys, threading
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import islice
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# marks the start of a word, so grams also tell where a word begins
+WORD_START = '$'
+GRAM_SIZE = 3
+
+# serializes first builds of fuzzy vocabularies, indexes are pickled in snapshots and can't hold a lock
+_vocabulary_lock = threading.Lock()
+
+
+def fold(text):
+    """Case fold text for case-insensitive comparison"""
+    return text.casefold()
+
+
+def grams_of(word):
+    """Return distinct trigrams of a word, the first one includes the word start"""
+    word = WORD_START + word
+    return {word[i:i + GRAM_SIZE] for i in range(max(1, len(word) - GRAM_SIZE + 1))}
+
+
+def prefix_distance(query, text, max_distance):
+    """ Return edit distance between query and the closest prefix of text,
+        max_distance + 1 as soon as it's certain to be larger than max_distance
+        e.g. prefix_distance('coffeyrasmusen@', 'coffeyrasmussen@flotonic.com', 2) == 1
+    """
+    # previous[j] is the distance between the query read so far and text[:j]
+    previous = list(range(min(len(text), len(query) + max_distance) + 1))
+    for i, char in enumerate(query, 1):
+        current = [i]
+        for j in range(1, len(previous)):
+            cost = 0 if text[j - 1] == char else 1
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous)
+
+
+def terms_of(value):
+    """ Return (term, value) pairs of a value, a term runs from the start of a word to the end
+        e.g. 'francisca rasmussen' has 'francisca rasmussen' and 'rasmussen'
+    """
+    terms = [(value[word.start():], value) for word in WORD_PATTERN.finditer(value)]
+    # a value without word characters, e.g. '@@', is its only term
+    return terms or [(value, value)]
+
+
+class LookupIndex:
+    """
+        Typeahead index of a string field (or of the strings of a list field) with
+        * case-insensitive exact lookups of case folded values
+        * prefix lookups over the sorted terms of every value, a term is the value
+          from the start of one of its words to its end, so 'ras' finds 'Francisca Rasmussen'
+        * fuzzy lookups that pick words sharing trigrams with the query and rank their
+          terms by edit distance between the query and the closest prefix of the term,
+          the trigrams of the words are built on the first fuzzy lookup
+    """
+
+    max_values_per_word = 1000
+
+    def __init__(self, field) -> None:
+        self.field = field
+        self.__positions = {}
+        self.__terms = []
+        self.__words = []
+        self.__word_ids = {}
+        self.__grams = None
+
+    @classmethod
+    def build(cls, field, data):
+        """ Build index of the field over all rows of data
+            field: (str) indexed field
+            data: (list) list of dictionaries
+            :return: LookupIndex
+        """
+        index = cls(field)
+        all_positions = index.__positions
+        for position, item in enumerate(data):
+            # deleted rows are kept as None so positions stay stable
+            if item is not None:
+                for value in index.values_of(item):
+                    positions = all_positions.get(value)
+                    if positions is None:
+                        all_positions[value] = [position]
+                    elif positions[-1] != position:
+                        positions.append(position)
+
+        # terms are sorted once instead of inserted one by one
+        for value in all_positions:
+            index.__terms.extend(terms_of(value))
+        index.__terms.sort()
+        return index
+
+    def values_of(self, item):
+        """ Return case folded strings of the row
+            item: (dict) the row
+            :return: list of str
+        """
+        found_value = item.get(self.field)
+        if isinstance(found_value, str):
+            return [fold(found_value)]
+        if isinstance(found_value, list):
+            return list(dict.fromkeys(fold(element) for element in found_value if isinstance(element, str)))
+        return []
+
+    def __vocabulary(self):
+        """ Return trigrams of the words of all values, they're built on first use, fuzzy lookups
+            run under read locks, so the build is serialized and the trigrams are published when complete
+        """
+        grams = self.__grams
+        if grams is None:
+            with _vocabulary_lock:
+                grams = self.__grams
+                if grams is None:
+                    grams = {}
+                    words = set()
+                    for value in self.__positions:
+                        words.update(WORD_PATTERN.findall(value))
+                    for word in words:
+                        self.__add_word(word, grams)
+                    self.__grams = grams
+        return grams
+
+    def __add_word(self, word, grams):
+        """Add a word to the fuzzy vocabulary"""
+        if word in self.__word_ids:
+            return
+        word_id = self.__word_ids[word] = len(self.__words)
+        self.__words.append(word)
+        for gram in grams_of(word):
+            word_ids = grams.get(gram)
+            if word_ids is None:
+                grams[gram] = [word_id]
+            else:
+                word_ids.append(word_id)
+
+    def add(self, position, item):
+        """ Add row to the index
+            position: (int) position of the row in the dataset
+            item: (dict) the row itself
+        """
+        for value in self.values_of(item):
+            positions = self.__positions.get(value)
+            if positions is None:
+                positions = self.__positions[value] = []
+                for term in terms_of(value):
+                    insort(self.__terms, term)
+                if self.__grams is not None:
+                    for word in WORD_PATTERN.findall(value):
+                        self.__add_word(word, self.__grams)
+            i = bisect_left(positions, position)
+            if i == len(positions) or positions[i] != position:
+                positions.insert(i, position)
+
+    def remove(self, position, item):
+        """ Remove row from the index, words stay in the fuzzy vocabulary
+            position: (int) position of the row in the dataset
+            item: (dict) the row as it was added
+        """
+        for value in self.values_of(item):
+            positions = self.__positions.get(value)
+            if not positions:
+                continue
+            i = bisect_left(positions, position)
+            if i < len(positions) and positions[i] == position:
+                del positions[i]
+            if not positions:
+                del self.__positions[value]
+                for term in terms_of(value):
+                    i = bisect_left(self.__terms, term)
+                    if i < len(self.__terms) and self.__terms[i] == term:
+                        del self.__terms[i]
+
+    def exact(self, text):
+        """ Return sorted positions of rows holding text, ignoring case
+            text: (str)
+            :return: list of positions
+        """
+        return list(self.__positions.get(fold(text), []))
+
+    def __completions(self, prefix):
+        """Generate values with a term starting with the prefix, in order of their terms"""
+        seen = set()
+        for i in range(bisect_left(self.__terms, (prefix,)), len(self.__terms)):
+            term, value = self.__terms[i]
+            if not term.startswith(prefix):
+                return
+            if value not in seen:
+                seen.add(value)
+                yield value
+
+    def prefix(self, text, limit=10):
+        """ Return positions of rows with a word starting with text, ignoring case,
+            values are ordered by their matching terms, the shortest completion first
+            text: (str) typed text
+            limit: (int) maximum number of positions
+            :return: list of positions
+        """
+        return self.__take(self.__completions(fold(text)), limit)
+
+    def fuzzy(self, text, limit=10, max_distance=None):
+        """ Return positions of rows with a term close to text, e.g. 'francisa' or
+            'coffeyrasmusen@', best matches first
+            text: (str) typed text
+            limit: (int) maximum number of positions
+            max_distance: (int) maximum number of edits, as default one per four characters
+            :return: list of positions
+        """
+        query = fold(text)
+        first_word = WORD_PATTERN.search(query)
+        if first_word is None:
+            return []
+        if max_distance is None:
+            max_distance = max(1, len(query) // 4)
+
+        # candidate words share grams with the first word of the query,
+        # an edit changes at most GRAM_SIZE grams
+        vocabulary = self.__vocabulary()
+        grams = grams_of(first_word.group())
+        shared = Counter()
+        for gram in grams:
+            shared.update(vocabulary.get(gram, ()))
+        least_shared = max(1, len(grams) - GRAM_SIZE * max_distance)
+        candidates = [word_id for word_id, count in shared.most_common(200) if count >= least_shared]
+
+        ranked = []
+        for word_id in candidates:
+            word = self.__words[word_id]
+            # values of a very common word are only partly ranked
+            for value in islice(self.__completions(word), self.max_values_per_word):
+                for term, _ in terms_of(value):
+                    if WORD_PATTERN.match(term).group() != word:
+                        continue
+                    distance = prefix_distance(query, term, max_distance)
+                    if distance <= max_distance:
+                        ranked.append((distance, len(term), value))
+                        break
+        ranked.sort()
+        return self.__take(dict.fromkeys(value for _, _, value in ranked), limit)
+
+    def __take(self, values, limit):
+        positions = []
+        for value in values:
+            positions.extend(self.__positions.get(value, ())[:limit - len(positions)])
+            if len(positions) >= limit:
+                break
+        return positions
+
+    def stats(self):
+        """ Return size information of the index
+            :return: dictionary with number of values, stored terms and memory in bytes
+        """
+        memory = sys.getsizeof(self.__positions) + sys.getsizeof(self.__terms)
+        memory += sum(sys.getsizeof(positions) for positions in self.__positions.values())
+        memory += sum(sys.getsizeof(term) + sys.getsizeof(term[0]) for term in self.__terms)
+        if self.__grams is not None:
+            memory += sys.getsizeof(self.__grams) + sum(sys.getsizeof(word_ids) for word_ids in self.__grams.values())
+        return {'keys': len(self.__positions), 'entries': len(self.__terms), 'memory': memory}
+
+    def __len__(self):
+        return len(self.__positions)
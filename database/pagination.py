@@ -0,0 +1,46 @@
+import base64, json
+from .exceptions import *
+
+
+class Page:
+    """
+        One page of filter results
+        * items: matched items of the page
+        * cursor: continuation token of the next page, None on the last page
+    """
+
+    def __init__(self, items, cursor=None) -> None:
+        self.items = items
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(field, value, after, generation):
+    """ Encode keyset continuation token
+        field, value: filter the token belongs to
+        after: (int) position of the last returned row
+        generation: (int) generation of row positions of the db
+        :return: (str) url safe token
+    """
+    payload = json.dumps([field, value, after, generation], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, field, value, generation):
+    """ Decode keyset continuation token and check that it belongs to the filter
+        :return: (int) position of the last returned row
+    """
+    try:
+        cursor_field, cursor_value, after, cursor_generation = json.loads(base64.urlsafe_b64decode(cursor))
+    except Exception:
+        raise QueryIsInvalidError('cursor is not valid')
+    if [cursor_field, cursor_value] != [field, value] or type(cursor_value) is not type(value):
+        raise QueryIsInvalidError('cursor belongs to another filter')
+    if cursor_generation != generation:
+        raise QueryIsInvalidError('cursor is outdated, rows were compacted or reloaded')
+    return after
@@ -0,0 +1,104 @@
+import mmap, os, pickle, tempfile, threading, weakref
+from concurrent.futures import ProcessPoolExecutor
+from .concurrency import process_context
+
+# shards already loaded by the current worker process, keyed by (path, offset),
+# a worker only ever receives the shards pinned to it
+_loaded_shards = {}
+
+
+def _load_shard(path, offset, size):
+    key = (path, offset)
+    rows = _loaded_shards.get(key)
+    if rows is None:
+        with open(path, 'rb') as shard_file, \
+                mmap.mmap(shard_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                rows = pickle.loads(view[offset:offset + size])
+        _loaded_shards[key] = rows
+    return rows
+
+
+def _scan_shard(path, offset, size, start, predicate):
+    """Worker task: return dataset positions of shard rows matching the predicate"""
+    rows = _load_shard(path, offset, size)
+    return [start + i for i, item in enumerate(rows) if item is not None and predicate.matches(item)]
+
+
+def _close(pools, path):
+    for pool in pools:
+        pool.shutdown(wait=False)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ShardedScanner:
+    """
+        Scans rows with worker processes, rows are split into contiguous shards
+        that are pickled once into a memory-mapped file, every shard is pinned to one worker
+        that keeps it unpickled for the next scans, so workers hold one copy of the rows together
+    """
+
+    def __init__(self, data, workers=None, shards_per_worker=4) -> None:
+        """ data: (list) rows, None rows (deleted) are skipped
+            workers: (int) number of processes, as default the number of cores
+            shards_per_worker: (int) more shards balance uneven shards better
+        """
+        self.workers = workers or os.cpu_count() or 1
+        descriptor, self.path = tempfile.mkstemp(prefix='jsondb-shards-')
+        self.__shards = []
+        shard_count = max(1, min(len(data), self.workers * shards_per_worker))
+        shard_size = -(-len(data) // shard_count) if data else 0
+        with os.fdopen(descriptor, 'wb') as shard_file:
+            for start in range(0, len(data), shard_size or 1):
+                payload = pickle.dumps(data[start:start + shard_size], protocol=pickle.HIGHEST_PROTOCOL)
+                self.__shards.append((shard_file.tell(), len(payload), start))
+                shard_file.write(payload)
+        # one single-process pool per worker, so a shard is always sent to the same process,
+        # scans run in threads of the query executor, so workers aren't forked
+        context = process_context()
+        self.__pools = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(self.workers)]
+        self.__finalizer = weakref.finalize(self, _close, self.__pools, self.path)
+        self.__lock = threading.Lock()
+        self.__scans = 0
+        self.__retired = False
+
+    def scan(self, predicate):
+        """ Return positions of rows matching the predicate in dataset order
+            predicate: (Predicate) picklable predicate of database.query
+            :return: list of positions
+        """
+        futures = [
+            self.__pools[i % self.workers].submit(_scan_shard, self.path, offset, size, start, predicate)
+            for i, (offset, size, start) in enumerate(self.__shards)
+        ]
+        positions = []
+        # shards are contiguous, so concatenating them in order keeps dataset order
+        for future in futures:
+            positions.extend(future.result())
+        return positions
+
+    def acquire(self):
+        """Register a scan about to run, a retired scanner is only closed once its scans finished"""
+        with self.__lock:
+            self.__scans += 1
+
+    def release(self):
+        """Unregister a finished scan"""
+        with self.__lock:
+            self.__scans -= 1
+            close = self.__retired and not self.__scans
+        if close:
+            self.close()
+
+    def retire(self):
+        """Close the scanner now when no scan is running, otherwise when the last one finishes"""
+        with self.__lock:
+            self.__retired = True
+            close = not self.__scans
+        if close:
+            self.close()
+
+    def close(self):
+        """Stop worker processes and remove the shard file"""
+        self.__finalizer()
@@ -0,0 +1,472 @@
+import json, operator, re
+from bisect import bisect_left
+from heapq import merge
+from .exceptions import *
+from .index import SCALAR_TYPES, value_matches
+
+
+class Predicate:
+    """
+        Base class of all query predicates, predicates can be combined with
+        & (AND), | (OR) and ~ (NOT)
+    """
+
+    def matches(self, item):
+        """Check whether the row (dict) satisfies the predicate"""
+        raise NotImplementedError()
+
+    def fields(self):
+        """Return fields the predicate reads"""
+        raise NotImplementedError()
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class FieldPredicate(Predicate):
+    """Base class of predicates that compare one field with a value"""
+    symbol = None
+
+    def __init__(self, field, value) -> None:
+        self.field = field
+        self.value = value
+
+    def fields(self):
+        return {self.field}
+
+    def matches(self, item):
+        found_value = item.get(self.field)
+        if isinstance(found_value, list):
+            return any(self.compare(element) for element in found_value)
+        return self.compare(found_value)
+
+    def compare(self, found_value):
+        """Compare a single stored value (or list element) with the predicate value"""
+        raise NotImplementedError()
+
+    def __str__(self):
+        return f'{self.field} {self.symbol} {json.dumps(self.value)}'
+
+
+class Eq(FieldPredicate):
+    """field == value with JSONDB.exists rules, list fields match when they contain the value"""
+    symbol = '='
+
+    def __init__(self, field, value) -> None:
+        assert type(value) in SCALAR_TYPES, "value must string, integer or boolean type"
+        super().__init__(field, value)
+
+    def matches(self, item):
+        return value_matches(item.get(self.field), self.value)
+
+
+class Contains(Eq):
+    """List field contains the value"""
+    symbol = 'CONTAINS'
+
+    def matches(self, item):
+        found_value = item.get(self.field)
+        return isinstance(found_value, list) and self.value in found_value
+
+
+class Compare(FieldPredicate):
+    """Range comparison, numbers are compared with numbers and strings with strings"""
+    operators = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+    def __init__(self, field, symbol, value) -> None:
+        assert symbol in self.operators, "comparison must be one of <, <=, >, >="
+        assert is_comparable(value), "value must be a number or a string"
+        super().__init__(field, value)
+        self.symbol = symbol
+        self.__compare = self.operators[symbol]
+
+    def compare(self, found_value):
+        if not is_comparable(found_value) or isinstance(found_value, str) != isinstance(self.value, str):
+            return False
+        return self.__compare(found_value, self.value)
+
+
+class Prefix(FieldPredicate):
+    """String field (or element of list field) starts with the prefix"""
+    symbol = 'STARTSWITH'
+
+    def __init__(self, field, prefix) -> None:
+        assert isinstance(prefix, str), "prefix must be string type"
+        super().__init__(field, prefix)
+
+    def compare(self, found_value):
+        return isinstance(found_value, str) and found_value.startswith(self.value)
+
+
+class And(Predicate):
+    """All predicates are satisfied"""
+
+    def __init__(self, *predicates) -> None:
+        assert predicates, "at least one predicate is required"
+        self.predicates = predicates
+
+    def matches(self, item):
+        return all(predicate.matches(item) for predicate in self.predicates)
+
+    def fields(self):
+        return set().union(*(predicate.fields() for predicate in self.predicates))
+
+    def __str__(self):
+        return '(' + ' AND '.join(str(predicate) for predicate in self.predicates) + ')'
+
+
+class Or(And):
+    """At least one predicate is satisfied"""
+
+    def matches(self, item):
+        return any(predicate.matches(item) for predicate in self.predicates)
+
+    def __str__(self):
+        return '(' + ' OR '.join(str(predicate) for predicate in self.predicates) + ')'
+
+
+class Not(Predicate):
+    """Predicate is not satisfied"""
+
+    def __init__(self, predicate) -> None:
+        self.predicate = predicate
+
+    def matches(self, item):
+        return not self.predicate.matches(item)
+
+    def fields(self):
+        return self.predicate.fields()
+
+    def __str__(self):
+        return f'NOT {self.predicate}'
+
+
+def is_comparable(value):
+    return type(value) in {int, float, str}
+
+
+# ======================== Expression language ========================
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'[^']*')
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<operator><=|>=|!=|=|<|>)
+      | (?P<parenthesis>[()])
+      | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    )''', re.VERBOSE)
+
+KEYWORDS = {'AND', 'OR', 'NOT', 'CONTAINS', 'STARTSWITH', 'TRUE', 'FALSE'}
+
+
+def tokenize(expression):
+    """ Split expression into (kind, value) tokens
+        expression: (str) query expression
+        :return: list of tokens
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None:
+            raise QueryIsInvalidError(f'unexpected character at position {position}: {expression[position:]!r}')
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'string':
+            tokens.append(('value', json.loads(text) if text[0] == '"' else text[1:-1]))
+        elif kind == 'number':
+            tokens.append(('value', float(text) if '.' in text else int(text)))
+        elif kind == 'word' and text.upper() in {'TRUE', 'FALSE'}:
+            tokens.append(('value', text.upper() == 'TRUE'))
+        elif kind == 'word' and text.upper() in KEYWORDS:
+            tokens.append(('keyword', text.upper()))
+        elif kind == 'word':
+            tokens.append(('field', text))
+        else:
+            tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """
+        Parses expressions such as
+        status = "open" AND (priority = "high" OR NOT tags CONTAINS "Ohio") AND created_at >= "2016"
+    """
+
+    def __init__(self, expression) -> None:
+        self.__tokens = tokenize(expression)
+        self.__position = 0
+
+    def parse(self):
+        """Return predicate of the whole expression"""
+        predicate = self.__or()
+        if self.__peek() is not None:
+            raise QueryIsInvalidError(f'unexpected token {self.__peek()[1]!r}')
+        return predicate
+
+    def __peek(self):
+        return self.__tokens[self.__position] if self.__position < len(self.__tokens) else None
+
+    def __next(self, kind=None, value=None):
+        token = self.__peek()
+        if token is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or 'token'
+            raise QueryIsInvalidError(f'expected {expected} but found {token[1] if token else "end of query"!r}')
+        self.__position += 1
+        return token
+
+    def __accept(self, kind, value):
+        if self.__peek() == (kind, value):
+            self.__position += 1
+            return True
+        return False
+
+    def __or(self):
+        predicates = [self.__and()]
+        while self.__accept('keyword', 'OR'):
+            predicates.append(self.__and())
+        return predicates[0] if len(predicates) == 1 else Or(*predicates)
+
+    def __and(self):
+        predicates = [self.__not()]
+        while self.__accept('keyword', 'AND'):
+            predicates.append(self.__not())
+        return predicates[0] if len(predicates) == 1 else And(*predicates)
+
+    def __not(self):
+        if self.__accept('keyword', 'NOT'):
+            return Not(self.__not())
+        if self.__accept('parenthesis', '('):
+            predicate = self.__or()
+            self.__next('parenthesis', ')')
+            return predicate
+        return self.__comparison()
+
+    def __comparison(self):
+        field = self.__next('field')[1]
+        kind, symbol = self.__next()
+        value = self.__next('value')[1]
+        try:
+            if (kind, symbol) == ('operator', '='):
+                return Eq(field, value)
+            if (kind, symbol) == ('operator', '!='):
+                return Not(Eq(field, value))
+            if kind == 'operator':
+                return Compare(field, symbol, value)
+            if (kind, symbol) == ('keyword', 'CONTAINS'):
+                return Contains(field, value)
+            if (kind, symbol) == ('keyword', 'STARTSWITH'):
+                return Prefix(field, value)
+        except AssertionError as e:
+            raise QueryIsInvalidError(f'{field} {symbol} {value!r}: {e}')
+        raise QueryIsInvalidError(f'unknown operator {symbol!r}')
+
+
+def parse(expression):
+    """ Parse a query expression
+        expression: (str or Predicate) expression, predicates are returned as they are
+        :return: Predicate
+    """
+    if isinstance(expression, Predicate):
+        return expression
+    if not isinstance(expression, str):
+        raise QueryIsInvalidError('query must be a string or a predicate')
+    return Parser(expression).parse()
+
+
+# ============================== Planner ==============================
+
+class Plan:
+    """Base class of plan nodes, execute returns sorted row positions"""
+    estimate = 0
+
+    def execute(self, stats):
+        raise NotImplementedError()
+
+    def describe(self, depth=0):
+        raise NotImplementedError()
+
+
+class IndexScan(Plan):
+    """Positions read from the hash index bucket of an = or CONTAINS predicate"""
+
+    def __init__(self, predicate, positions) -> None:
+        self.predicate = predicate
+        self.positions = positions
+        self.estimate = len(positions)
+
+    def execute(self, stats):
+        stats['examined'] += len(self.positions)
+        return self.positions
+
+    def describe(self, depth=0):
+        return ['  ' * depth + f'INDEX SCAN {self.predicate} (estimated {self.estimate} rows)']
+
+
+class Intersection(Plan):
+    """Intersection of sorted positions, most selective child first"""
+
+    def __init__(self, children) -> None:
+        self.children = sorted(children, key=lambda child: child.estimate)
+        self.estimate = self.children[0].estimate
+
+    def execute(self, stats):
+        positions = self.children[0].execute(stats)
+        for child in self.children[1:]:
+            if not positions:
+                break
+            other = child.execute(stats)
+            positions = [p for p in positions if contains_sorted(other, p)]
+        return positions
+
+    def describe(self, depth=0):
+        lines = ['  ' * depth + f'INTERSECT (estimated {self.estimate} rows)']
+        for child in self.children:
+            lines.extend(child.describe(depth + 1))
+        return lines
+
+
+class Union(Plan):
+    """Union of sorted positions"""
+
+    def __init__(self, children) -> None:
+        self.children = children
+        self.estimate = sum(child.estimate for child in children)
+
+    def execute(self, stats):
+        positions = []
+        for position in merge(*(child.execute(stats) for child in self.children)):
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        return positions
+
+    def describe(self, depth=0):
+        lines = ['  ' * depth + f'UNION (estimated {self.estimate} rows)']
+        for child in self.children:
+            lines.extend(child.describe(depth + 1))
+        return lines
+
+
+class Residual(Plan):
+    """Rows of the child plan checked against predicates the indexes can't answer"""
+
+    def __init__(self, child, predicates) -> None:
+        self.child = child
+        self.predicates = predicates
+        self.estimate = child.estimate
+
+    def execute(self, stats):
+        positions = self.child.execute(stats)
+        stats['examined'] += len(positions)
+        data = stats['data']
+        return [p for p in positions if all(predicate.matches(data[p]) for predicate in self.predicates)]
+
+    def describe(self, depth=0):
+        predicates = ' AND '.join(str(predicate) for predicate in self.predicates)
+        lines = ['  ' * depth + f'FILTER {predicates} (estimated at most {self.estimate} rows)']
+        return lines + self.child.describe(depth + 1)
+
+
+class FullScan(Plan):
+    """Every row checked against the predicate"""
+
+    def __init__(self, predicate, size) -> None:
+        self.predicate = predicate
+        self.estimate = size
+
+    def execute(self, stats):
+        data = stats['data']
+        stats['examined'] += len(data)
+        return [p for p, item in enumerate(data) if item is not None and self.predicate.matches(item)]
+
+    def describe(self, depth=0):
+        return ['  ' * depth + f'FULL SCAN {self.predicate} (estimated at most {self.estimate} rows)']
+
+
+def contains_sorted(positions, position):
+    """Binary search of position in sorted positions"""
+    i = bisect_left(positions, position)
+    return i < len(positions) and positions[i] == position
+
+
+class Planner:
+    """
+        Cost based planner, indexed predicates are answered from their index buckets
+        (whose sizes are exact row estimates) and intersected from the most selective one,
+        remaining predicates only check the candidate rows
+    """
+
+    def __init__(self, data, fields, index) -> None:
+        """ data: (list) rows
+            fields: (set) known fields
+            index: function returning HashIndex of a field or None when it's not indexed
+        """
+        self.__data = data
+        self.__fields = fields
+        self.__index = index
+
+    def plan(self, predicate):
+        """Return plan of the predicate"""
+        for field in predicate.fields():
+            if field not in self.__fields:
+                raise FieldNotFoundError()
+
+        plan, exact = self.__indexed(predicate)
+        if plan is None:
+            return FullScan(predicate, len(self.__data))
+        return plan if exact else Residual(plan, [predicate])
+
+    def __indexed(self, predicate):
+        """ Return plan answering the predicate from indexes and whether it's exact,
+            an inexact plan returns a superset of matching rows
+        """
+        if isinstance(predicate, Eq):
+            index = self.__index(predicate.field)
+            if index is None:
+                return None, False
+            return IndexScan(predicate, index.lookup(predicate.value)), type(predicate) is Eq
+
+        if isinstance(predicate, Or):
+            children = [self.__indexed(child) for child in predicate.predicates]
+            if any(plan is None for plan, _ in children):
+                return None, False
+            return Union([plan for plan, _ in children]), all(exact for _, exact in children)
+
+        if isinstance(predicate, And):
+            plans, residual = [], []
+            for child in predicate.predicates:
+                plan, exact = self.__indexed(child)
+                if plan is not None:
+                    plans.append(plan)
+                if plan is None or not exact:
+                    residual.append(child)
+            if not plans:
+                return None, False
+            plan = plans[0] if len(plans) == 1 else Intersection(plans)
+            return (Residual(plan, residual) if residual else plan), True
+
+        return None, False
+
+    def execute(self, predicate):
+        """ Run the predicate
+            :return: tuple of (plan, matched positions, number of examined rows and index entries)
+        """
+        plan = self.plan(predicate)
+        stats = {'data': self.__data, 'examined': 0}
+        positions = plan.execute(stats)
+        return plan, positions, stats['examined']
+
+    def explain(self, predicate):
+        """Run the predicate and describe its plan with estimated and examined rows"""
+        plan, positions, examined = self.execute(predicate)
+        lines = plan.describe()
+        lines.append(f'estimated {plan.estimate} rows, examined {examined}, returned {len(positions)} rows')
+        return '\n'.join(lines)
@@ -0,0 +1,108 @@
+from .exceptions import *
+
+
+class ForeignKey:
+    """
+        Declares that field of entity references target_field of target entity
+        * name: name of the referenced record seen from entity (e.g. 'organization')
+        * related_name: name of the referencing records seen from target (e.g. 'tickets')
+    """
+
+    def __init__(self, entity, field, target, target_field='_id', name=None, related_name=None) -> None:
+        self.entity = entity
+        self.field = field
+        self.target = target
+        self.target_field = target_field
+        self.name = name or field
+        self.related_name = related_name or f'{entity}_{self.name}'
+
+
+class Relations:
+    """
+        Relational layer that joins records of connected databases through foreign keys,
+        every join is answered by index probes of the target database
+    """
+
+    def __init__(self, databases, foreign_keys) -> None:
+        """ databases: (dict) entity name to connected Database
+            foreign_keys: (list) ForeignKey objects or tuples of ForeignKey arguments
+        """
+        self.__databases = databases
+        self.__forward = {}
+        self.__reverse = {}
+        for foreign_key in foreign_keys:
+            if not isinstance(foreign_key, ForeignKey):
+                foreign_key = ForeignKey(*foreign_key)
+            assert foreign_key.entity in databases, f"{foreign_key.entity} database is not defined"
+            assert foreign_key.target in databases, f"{foreign_key.target} database is not defined"
+            self.__forward.setdefault(foreign_key.entity, {})[foreign_key.name] = foreign_key
+            self.__reverse.setdefault(foreign_key.target, {})[foreign_key.related_name] = foreign_key
+
+    def relation_names(self, entity):
+        """Return names of all relations of the entity"""
+        return list(self.__forward.get(entity, {})) + list(self.__reverse.get(entity, {}))
+
+    def __relation(self, entity, name):
+        if name in self.__forward.get(entity, {}):
+            return self.__forward[entity][name], False
+        if name in self.__reverse.get(entity, {}):
+            return self.__reverse[entity][name], True
+        raise FieldNotFoundError(f'{entity} has no relation named {name}')
+
+    def join(self, entity, records, name):
+        """ Hash join records with one relation, each distinct key is probed once
+            entity: (str) entity of the records
+            records: (list) records of the entity
+            name: (str) relation name
+            :return: list of related record (or list of records for reverse relations) per record
+        """
+        foreign_key, reverse = self.__relation(entity, name)
+        if reverse:
+            key_field, probe_field, probed = foreign_key.target_field, foreign_key.field, foreign_key.entity
+        else:
+            key_field, probe_field, probed = foreign_key.field, foreign_key.target_field, foreign_key.target
+
+        keys = [record.get(key_field) for record in records]
+        distinct_keys = list(dict.fromkeys(key for key in keys if type(key) in {str, int, bool}))
+        database = self.__databases[probed]
+
+        if reverse:
+            key_map = database.filter_many(probe_field, distinct_keys)
+            return [key_map.get(key, []) if type(key) in {str, int, bool} else [] for key in keys]
+
+        key_map = {key: database.get(probe_field, key) for key in distinct_keys}
+        return [key_map.get(key) if type(key) in {str, int, bool} else None for key in keys]
+
+    def related(self, entity, record, names=None):
+        """ Return related records of a record
+            entity: (str) entity of the record
+            record: (dict) record to find its related records
+            names: (list) relation names to include, all relations as default
+            :return: dictionary of relation name to related record or list of records
+        """
+        return self.related_many(entity, [record], names)[0]
+
+    def related_many(self, entity, records, names=None):
+        """ Return related records of every record, with a constant number of probes per relation key
+            entity: (str) entity of the records
+            records: (list) records of the entity
+            names: (list) relation names to include, all relations as default
+            :return: list of dictionaries of relation name to related records
+        """
+        names = self.relation_names(entity) if names is None else names
+        result = [{} for _ in records]
+        for name in names:
+            for related, joined in zip(result, self.join(entity, records, name)):
+                related[name] = joined
+        return result
+
+    def search(self, entity, field, value, names=None):
+        """ Filter entity and attach related records to every result
+            entity: (str) entity to search in
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            names: (list) relation names to include, all relations as default
+            :return: list of (record, related records) pairs
+        """
+        records = list(self.__databases[entity].filter(field, value))
+        return list(zip(records, self.related_many(entity, records, names)))
@@ -0,0 +1,231 @@
+from itertools import chain
+from .exceptions import DataIsInvalidError, FieldNotFoundError
+from .index import value_matches
+
+SCALAR_NAMES = {'str', 'int', 'bool'}
+SCALAR_OR_NULL = {str, int, bool, type(None)}
+
+
+class FieldSchema:
+    """
+        Types and statistics of the values of one field, inferred when data is loaded
+        name: (str) field name
+        types: (set) type names of not null values, e.g. {'int'} or {'list'}
+        item_types: (set) type names of not null elements of list values
+        nullable: (bool) whether some rows miss the field or hold null
+        cardinality: (int) number of distinct scalar values (or list elements) when data was loaded,
+                     max_distinct + 1 for fields with more values than Schema.infer_rows tracks
+        count: (int) number of rows holding a not null value
+    """
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.types = set()
+        self.item_types = set()
+        self.nullable = False
+        self.cardinality = 0
+        self.count = 0
+
+    @property
+    def type(self):
+        """Type name of the field, 'mixed' when values have several types and 'null' when none"""
+        if not self.types:
+            return 'null'
+        return next(iter(self.types)) if len(self.types) == 1 else 'mixed'
+
+    @property
+    def is_list(self):
+        return self.types == {'list'}
+
+    def add(self, value, distinct=None):
+        """ Record a value of the field
+            distinct: (set) distinct scalar values seen so far, the value (or its elements) is added
+                      to it, None when cardinality isn't tracked
+        """
+        if value is None:
+            self.nullable = True
+            return
+        self.count += 1
+        kind = type(value).__name__
+        self.types.add(kind)
+        if kind == 'list':
+            for element in value:
+                if element is not None:
+                    self.item_types.add(type(element).__name__)
+                    if distinct is not None and type(element).__name__ in SCALAR_NAMES:
+                        distinct.add(element)
+        elif distinct is not None and kind in SCALAR_NAMES:
+            distinct.add(value)
+
+    @classmethod
+    def infer(cls, name, values):
+        """ Infer schema of a field from its value in every row (None where it's missing)"""
+        field_schema = cls(name)
+        types = set(map(type, values))
+        field_schema.nullable = type(None) in types
+        types.discard(type(None))
+        field_schema.types = {kind.__name__ for kind in types}
+        field_schema.count = len(values) - values.count(None) if field_schema.nullable else len(values)
+        if list in types:
+            # filter(None, ...) drops missing values (and empty lists) in C when every value is a list
+            lists = filter(None, values) if types == {list} else (value for value in values if type(value) is list)
+            elements = list(chain.from_iterable(lists))
+            element_types = set(map(type, elements))
+            field_schema.item_types = {kind.__name__ for kind in element_types - {type(None)}}
+            if not element_types <= SCALAR_OR_NULL:
+                elements = [element for element in elements if type(element) in SCALAR_OR_NULL]
+            values = elements if types == {list} else elements + [v for v in values if type(v) in SCALAR_OR_NULL]
+        elif not types <= SCALAR_OR_NULL:
+            values = [value for value in values if type(value) in SCALAR_OR_NULL]
+        distinct = set(values)
+        distinct.discard(None)
+        field_schema.cardinality = len(distinct)
+        return field_schema
+
+    def __value_types(self):
+        """Type names of the values a searched value is compared to, elements for list fields"""
+        return self.item_types if self.is_list else self.types
+
+    def coerce(self, value):
+        """ Convert a searched value typed by a user (str) to the type of the field,
+            values of other types and text that doesn't parse are returned as they are
+            e.g. '101' is 101 for an int field and stays '101' for a str field
+        """
+        if not isinstance(value, str):
+            return value
+        types = self.__value_types()
+        if 'str' in types:
+            return value
+        if 'bool' in types and value.lower() in {'true', 'false'}:
+            return value.lower() == 'true'
+        if 'int' in types:
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        return value
+
+    def matcher(self, value):
+        """ Return function telling whether a row matches the value like JSONDB.exists does,
+            specialized to the types of the field, so rows don't need type checks,
+            None when no row can match
+        """
+        name = self.name
+        numeric = type(value) is not str
+        if self.types <= SCALAR_NAMES:
+            if ('str' not in self.types) if not numeric else not (self.types & {'int', 'bool'}):
+                return None
+            return lambda item: item.get(name) == value
+        if self.is_list:
+            return lambda item: value in (item.get(name) or ())
+        return lambda item: value_matches(item.get(name), value)
+
+    def __eq__(self, other):
+        return isinstance(other, FieldSchema) and vars(self) == vars(other)
+
+    def __str__(self):
+        kind = f'list of {"/".join(sorted(self.item_types)) or "null"}' if self.is_list else self.type
+        return f'{kind}{", nullable" if self.nullable else ""}, {self.cardinality} distinct'
+
+    def __repr__(self):
+        return f'FieldSchema({self.name!r}, {self})'
+
+
+class Schema(dict):
+    """
+        Schema of a dataset, dictionary of field name to FieldSchema,
+        membership, iteration and len work like a set of field names
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.rows = 0
+
+    @classmethod
+    def infer(cls, data):
+        """ Infer schema of rows, values are collected column by column so most of the work
+            runs in C loops (set, map) rather than once per value in python
+            data: (iterable of dictionaries)
+            :return: Schema
+        """
+        data = data if isinstance(data, list) else list(data)
+        if not all(issubclass(kind, dict) for kind in set(map(type, data))):
+            raise DataIsInvalidError()
+        fields = dict.fromkeys(chain.from_iterable(data))
+
+        schema = cls()
+        schema.rows = len(data)
+        for field in fields:
+            schema[field] = FieldSchema.infer(field, [item.get(field) for item in data])
+        return schema
+
+    @classmethod
+    def infer_rows(cls, rows, max_distinct=256):
+        """ Infer schema reading rows one at a time, so rows may be a generator over a file
+            that is never held in memory
+            rows: (iterable of dictionaries)
+            max_distinct: (int) distinct values kept per field, fields with more of them
+                          report max_distinct + 1 as cardinality
+            :return: Schema
+        """
+        schema = cls()
+        distinct = {}
+        for item in rows:
+            if not isinstance(item, dict):
+                raise DataIsInvalidError()
+            schema.rows += 1
+            for field, value in item.items():
+                field_schema = schema.get(field)
+                if field_schema is None:
+                    field_schema = schema[field] = FieldSchema(field)
+                    distinct[field] = set()
+                values = distinct[field]
+                field_schema.add(value, values)
+                if values is not None and len(values) > max_distinct:
+                    # high-cardinality field, e.g. _id
+                    field_schema.cardinality = max_distinct + 1
+                    distinct[field] = None
+
+        for field, field_schema in schema.items():
+            values = distinct[field]
+            if values is not None:
+                values.discard(None)
+                field_schema.cardinality = len(values)
+            # rows missing the field aren't counted
+            if field_schema.count < schema.rows:
+                field_schema.nullable = True
+        return schema
+
+    def observe(self, item, row=True):
+        """ Record values written after loading, cardinality isn't updated
+            item: (dict) inserted row, or changes of updated rows when row is False
+        """
+        if row:
+            self.rows += 1
+            for field, field_schema in self.items():
+                if field not in item:
+                    field_schema.nullable = True
+        for field, value in item.items():
+            field_schema = self.get(field)
+            if field_schema is None:
+                field_schema = self[field] = FieldSchema(field)
+                # rows written before miss the field
+                field_schema.nullable = self.rows > 1 or not row
+            field_schema.add(value)
+
+    def coerce(self, field, value):
+        """ Convert a searched value typed by a user to the type of the field
+            :return: value of the type of the field, see FieldSchema.coerce
+        """
+        if field not in self:
+            raise FieldNotFoundError()
+        return self[field].coerce(value)
+
+    def copy(self):
+        schema = Schema()
+        schema.rows = self.rows
+        for field, field_schema in self.items():
+            schema[field] = copied = FieldSchema(field)
+            vars(copied).update({key: set(value) if isinstance(value, set) else value
+                                 for key, value in vars(field_schema).items()})
+        return schema
@@ -0,0 +1,91 @@
+"""
+    Binary snapshots of db state stored next to source files, so a restart skips parsing JSON.
+    Snapshots are pickles, and unpickling a file can run any code in it, so a snapshot is only
+    loaded when it's owned by the current user and no other user can write it (owner check where
+    the platform has user ids), otherwise it's ignored and the source is parsed. Anyone who can
+    write to the data directory as the current user can still run code, keep it private.
+"""
+import mmap, os, pickle, struct
+from stat import S_IWGRP, S_IWOTH
+
+MAGIC = b'JSONDBS1'
+HEADER = struct.Struct('<8sQ')
+SNAPSHOT_EXTENSION = '.snapshot'
+
+
+def snapshot_path(source):
+    """Return path of the snapshot stored next to the source file"""
+    return source + SNAPSHOT_EXTENSION
+
+
+def source_key(source):
+    """ Key that identifies the content of the source file
+        source: (str) path of the source file
+        :return: tuple of absolute path, modification time and size
+    """
+    stat = os.stat(source)
+    return os.path.abspath(source), stat.st_mtime_ns, stat.st_size
+
+
+def is_trusted(file_stat):
+    """ Return whether a snapshot file may be unpickled, it must be owned by the current user
+        and not writable by group or others
+        file_stat: (os.stat_result) stat of the opened snapshot file
+        :return: bool
+    """
+    if hasattr(os, 'getuid') and file_stat.st_uid != os.getuid():
+        return False
+    return not file_stat.st_mode & (S_IWGRP | S_IWOTH)
+
+
+def write_snapshot(source, state, key=None):
+    """ Write state of a db next to its source file, the snapshot is replaced atomically
+        source: (str) path of the source file
+        state: (dict) picklable state of the db
+        key: (tuple) source_key taken before the source was read, so a file replaced while it
+             was parsed doesn't get the old state, as default the current key
+        :return: (bool) whether the snapshot was written
+    """
+    path = snapshot_path(source)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        key = pickle.dumps(key or source_key(source), protocol=pickle.HIGHEST_PROTOCOL)
+        # created without group and others write permission, whatever the umask is, see is_trusted
+        descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        with os.fdopen(descriptor, 'wb') as snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, len(key)))
+            snapshot_file.write(key)
+            pickle.dump(state, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except OSError:
+        # a read-only data directory only means that the next start parses json again
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return False
+    return True
+
+
+def load_snapshot(source):
+    """ Load state of a db from the snapshot of its source file
+        source: (str) path of the source file
+        :return: (dict) state or None when there is no valid snapshot for the current source,
+                 or the snapshot isn't trusted
+    """
+    path = snapshot_path(source)
+    try:
+        key = source_key(source)
+        with open(path, 'rb') as snapshot_file:
+            # the opened file is checked, so it can't be replaced between the check and the load
+            if not is_trusted(os.fstat(snapshot_file.fileno())):
+                return None
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, key_length = HEADER.unpack_from(mapped)
+                if magic != MAGIC:
+                    return None
+                with memoryview(mapped) as view:
+                    if pickle.loads(view[HEADER.size:HEADER.size + key_length]) != key:
+                        return None
+                    return pickle.loads(view[HEADER.size + key_length:])
+    except Exception:
+        # snapshot is only a cache, any broken or outdated one is ignored
+        return None
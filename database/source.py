@@ -1,7 +1,27 @@
-import json
+import heapq, itertools, json, os, threading, time
+from bisect import bisect_right
+from itertools import islice
 from abc import ABC, abstractmethod
-from .decorators import required_connection
+from .cache import QueryCache
+from .concurrency import ReadWriteLock
+from .decoders import get_decoder
+from .decorators import required_connection, read_locked, write_locked
 from .exceptions import *
+from .export import export, project
+from .fulltext import FullTextIndex, TEXT_FIELDS
+from .pagination import Page, encode_cursor, decode_cursor
+from .parallel import ShardedScanner
+from .index import CountIndex, HashIndex, IndexPolicy, SortedIndex, OFF
+from .lookup import LookupIndex
+from .query import Eq, Planner, parse
+from .schema import Schema
+from .snapshot import load_snapshot, source_key, write_snapshot
+from .wal import WriteAheadLog, log_key, INSERT, UPDATE, DELETE
+from .watcher import SourceWatcher
+
+
+# modes of typeahead queries, in the order suggestions use them
+TYPEAHEAD_MODES = ('exact', 'prefix', 'fuzzy')
 
 
 class DBInterface(ABC):
@@ -30,6 +50,9 @@ class BaseDB(DBInterface):
         Base class that all types of databases should extend from
     """
 
+    # Instrumentation given by Database.connect, None when metrics are off
+    instrumentation = None
+
     @abstractmethod
     def add_data(self, data):
         """Abstract method to store source of data"""
@@ -39,52 +62,371 @@ class BaseDB(DBInterface):
         """Optional method to any processing"""
         raise NotImplementedError()
 
+    def filter_many(self, field, values):
+        """ Apply filtering for many values, concrete DBs can override it to answer in one pass
+            field: (str) field to apply filter based on it
+            values: (list of str, int, bool) values to apply filter based on them
+            :return: dictionary of value to result of filter
+        """
+        return {value: list(self.filter(field, value)) for value in values}
+
+    def has_index(self, field):
+        """Return whether lookups of the field are answered by an already built index"""
+        return False
+
+    def count(self, field, value):
+        """Return number of matched items, concrete DBs can override it to avoid building rows"""
+        return sum(1 for _ in self.filter(field, value))
+
+    def page(self, field, value, limit=100, cursor=None):
+        """ Return one page of filter results, the cursor is the offset of the page
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            limit: (int) number of items of the page
+            cursor: (str) cursor of the previous page, None for the first page
+            :return: Page
+        """
+        assert isinstance(limit, int) and limit >= 1, "limit must be a positive integer"
+        offset = int(cursor or 0)
+        items = list(islice(self.filter(field, value), offset, offset + limit + 1))
+        next_cursor = str(offset + limit) if len(items) > limit else None
+        return Page(items[:limit], next_cursor)
+
+    def query(self, expression):
+        """Optional method to return rows matching a compound query"""
+        raise NotImplementedError()
+
+    def explain(self, expression):
+        """Optional method to describe how a compound query is answered"""
+        raise NotImplementedError()
+
+    def insert(self, item):
+        """Optional method to add a new item"""
+        raise NotImplementedError()
+
+    def update(self, field, value, changes):
+        """Optional method to change fields of matched items"""
+        raise NotImplementedError()
+
+    def delete(self, field, value):
+        """Optional method to remove matched items"""
+        raise NotImplementedError()
+
+    def scan(self, expression, workers=None):
+        """Optional method to apply a query with a parallel full scan"""
+        raise NotImplementedError()
+
+    def search(self, text, fields=None, limit=10):
+        """Optional method to return items ranked by full-text relevance"""
+        raise NotImplementedError()
+
+    def between(self, field, start=None, end=None, include_start=True, include_end=True):
+        """Optional method to return items whose timestamp field is between start and end"""
+        raise NotImplementedError()
+
+    def before(self, field, moment):
+        """Return items whose timestamp field is earlier than moment, ordered by time"""
+        return self.between(field, end=moment, include_end=False)
+
+    def after(self, field, moment):
+        """Return items whose timestamp field is later than moment, ordered by time"""
+        return self.between(field, start=moment, include_start=False)
+
+    def group_by(self, field):
+        """Optional method to return number of rows per value of the field"""
+        raise NotImplementedError()
+
+    def distinct(self, field):
+        """Return distinct values of the field, elements of list values one by one"""
+        return list(self.group_by(field))
+
+    def top_k(self, field, k=10):
+        """ Return the k most frequent values of the field
+            :return: list of (value, number of rows), most frequent first
+        """
+        return heapq.nlargest(k, self.group_by(field).items(), key=lambda pair: pair[1])
+
+    def typeahead(self, field, text, mode='prefix', limit=10):
+        """Optional method to return items whose string field matches typed text"""
+        raise NotImplementedError()
+
+    def suggest(self, field, text, limit=10):
+        """ Return items whose field equals text ignoring case, then items with a word starting
+            with it, then items close to it, at most limit items
+        """
+        result, seen = [], set()
+        for mode in TYPEAHEAD_MODES:
+            for item in self.typeahead(field, text, mode, limit):
+                if id(item) not in seen and len(result) < limit:
+                    seen.add(id(item))
+                    result.append(item)
+        return result
+
+    def min(self, field):
+        """Optional method to return the smallest number or earliest timestamp of the field"""
+        raise NotImplementedError()
+
+    def max(self, field):
+        """Optional method to return the largest number or latest timestamp of the field"""
+        raise NotImplementedError()
+
+    def export(self, target, format='jsonl', field=None, value=None, fields=None):
+        """Optional method to write matched (or all) items to a JSON Lines, CSV or columnar file"""
+        raise NotImplementedError()
+
+    def snapshot_state(self):
+        """Optional method to return picklable state that restore_state accepts"""
+        raise NotImplementedError()
+
+    def restore_state(self, state):
+        """Optional method to restore state returned by snapshot_state instead of processing data"""
+        raise NotImplementedError()
+
+    def new_empty(self):
+        """ Return a new db without data and with the settings of this one, reloads load into it,
+            concrete DBs with settings override it
+        """
+        return type(self)()
+
 
 class JSONDB(BaseDB):
     """
         This class allows navigation through JSON database
+        * reads run concurrently and writes are exclusive, see database.concurrency
     """
 
-    def __init__(self) -> None:
+    def __init__(self, index_policy=None, durable=False, decoder=None) -> None:
+        """ index_policy: (IndexPolicy) when to build field indexes
+            durable: (bool) fsync the write-ahead log after every write
+            decoder: (Decoder or str) decoder of json files, see database.decoders
+        """
         self.__data = []
-        self.__fields = set()
+        self.__deleted = 0
+        self.__schema = Schema()
+        self.__indexes = {}
+        self.__range_indexes = {}
+        self.__text_indexes = {}
+        self.__lookup_indexes = {}
+        self.__counts = {}
+        self.__index_policy = index_policy or IndexPolicy()
+        self.__durable = durable
+        self.__decoder = get_decoder(decoder)
+        self.__source = None
+        self.__wal = None
+        self.__retired = False
+        self.lock = ReadWriteLock()
+        # changes whenever data changes, cached derived state compares it
+        self.version = 0
+        # changes whenever row positions are renumbered, cursors compare it
+        self.__generation = 0
+        self.__scanner = None
+        self.__scanner_lock = threading.Lock()
+        # lazy index builds run under the read lock, they're serialized by this lock and published
+        # by replacing the dictionary of indexes with a copy, readers iterating the old one see no change
+        self.__build_lock = threading.Lock()
 
+    def new_empty(self):
+        """Return a new db without data and with the index policy, durability and decoder of this one"""
+        return type(self)(index_policy=self.__index_policy, durable=self.__durable, decoder=self.__decoder)
+
+    @write_locked
     def add_data(self, data):
         """ Store data in memory.
             data: (list or str) data must be list or json path string that contains
-                   list of dictionaries ( or JSON objects)
+                   list of dictionaries ( or JSON objects), writes of a json path are
+                   logged next to it and replayed here
         """
+        source = key = None
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
         if not isinstance(data, list):
-            data = self.convert_file_path_to_json(data)
+            source = data
+            # logged writes apply to the version of the file that is parsed, it may change while it's parsed
+            key = log_key(source) if isinstance(source, str) else None
+            data = self.convert_file_path_to_json(data, self.__decoder)
+            if instrumentation is not None:
+                instrumentation.observe('parse', time.perf_counter() - start)
+                start = time.perf_counter()
 
         self.process_data(data)
+        if instrumentation is not None:
+            instrumentation.observe('process_data', time.perf_counter() - start)
         self.__data = data
+        self.__deleted = 0
+        self.version += 1
+        self.__generation += 1
+        self.__open_wal(source, key=key)
+
+    def __open_wal(self, source, offset=0, key=None):
+        if self.__wal is not None:
+            self.__wal.close()
+        self.__source = source
+        self.__wal = WriteAheadLog(source, self.__durable, key) if isinstance(source, str) else None
+        if self.__wal is not None:
+            for operation in self.__wal.replay(offset):
+                self.__apply(operation)
 
     def process_data(self, data):
-        """ Validate received data and store fields in memory"""
+        """ Validate received data, infer its schema and build per-field indexes in memory"""
         assert isinstance(data, list), "data must be list type"
-        for item in data:
-            if not isinstance(item, dict):
-                raise DataIsInvalidError()
-            self.__fields.update(item.keys())
+        self.__schema = Schema.infer(data)
 
-    def filter(self, field, value):
+        self.__indexes = {
+            field: HashIndex.build(field, data)
+            for field in self.__index_policy.eager_fields(self.__schema)
+        }
+        self.__range_indexes = {
+            field: SortedIndex.build(field, data)
+            for field in self.__index_policy.ranged & self.__schema.keys()
+        }
+        self.__text_indexes = {}
+        self.__counts = {}
+        self.__lookup_indexes = {
+            field: LookupIndex.build(field, data)
+            for field in self.__index_policy.lookup & self.__schema.keys()
+        }
+        if self.__index_policy.text is not None:
+            text_fields = self.__default_text_fields()
+            self.__text_indexes[text_fields] = FullTextIndex.build(text_fields, data)
+
+    def __positions(self, field, value):
+        """Return sorted positions of rows matching the value, from the index when there is one"""
+        assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        index = self.index(field)
+        if index is None:
+            match = self.__schema[field].matcher(value)
+            if match is None:
+                return []
+            return [p for p, item in enumerate(self.__data) if item is not None and match(item)]
+        return index.lookup(value)
+
+    def __iter_positions(self, field, value, after=-1):
+        """Generate sorted positions of rows matching the value that come after a position"""
+        assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        index = self.index(field)
+        if index is None:
+            data = self.__data
+            match = self.__schema[field].matcher(value)
+            if match is None:
+                return iter(())
+            return (p for p in range(after + 1, len(data)) if data[p] is not None and match(data[p]))
+        positions = index.lookup(value)
+        return islice(positions, bisect_right(positions, after), None)
+
+    def __check_fields(self, fields):
+        """Validate fields of a projection"""
+        assert isinstance(fields, (list, tuple)), "fields must be list type"
+        for field in fields:
+            if field not in self.__schema:
+                raise FieldNotFoundError()
+
+    def __items(self, positions, fields=None):
+        """Return items at positions, with only the given fields when there are some"""
+        data = self.__data
+        if fields is None:
+            return [data[position] for position in positions]
+        return [project(data[position], fields) for position in positions]
+
+    @read_locked
+    def filter(self, field, value, limit=None, offset=0, lazy=False, fields=None):
         """ Apply filtering
             field: (str) field to apply filter based on it
             value: (str, int, bool) value to apply filter based on it
+            limit: (int) maximum number of returned items, None for all of them
+            offset: (int) number of matched items to skip
+            lazy: (bool) return a generator that reads matched items page by page
+            fields: (list) fields of returned items, None for whole items
             :return: result of filter
         """
-        assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+        assert limit is None or (isinstance(limit, int) and limit >= 0), "limit must be None or a non-negative int"
+        assert isinstance(offset, int) and offset >= 0, "offset must be a non-negative integer"
+        if fields is not None:
+            self.__check_fields(fields)
+        if lazy:
+            assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+            if field not in self.__schema:
+                raise FieldNotFoundError()
+            return self.__iter_filter(field, value, limit, offset, fields)
 
-        if field not in self.__fields:
-            raise FieldNotFoundError()
+        positions = self.__iter_positions(field, value)
+        if offset or limit is not None:
+            positions = islice(positions, offset, None if limit is None else offset + limit)
+        if self.instrumentation is None:
+            return self.__items(positions, fields)
 
-        result = []
-        for item in self.__data:
-            if self.exists(item, field, value):
-                result.append(item)
+        positions = list(positions)
+        # a limited scan stops at the last returned row
+        last = positions[-1] if positions and limit is not None and len(positions) == limit else None
+        self.__observe_rows('filter', field, offset + len(positions), len(positions), last=last)
+        return self.__items(positions, fields)
 
-        return result
+    def __observe_rows(self, operation, field, matched, returned, first=0, last=None):
+        """ Record rows read by a query, an index reads matched rows only and a scan reads
+            rows from first up to last (the end of data when None)
+        """
+        indexed = field in self.__indexes
+        scanned = matched if indexed else (len(self.__data) if last is None else last + 1) - first
+        self.instrumentation.rows(operation, scanned, returned)
+        self.instrumentation.lookup('index', indexed)
+
+    def __iter_filter(self, field, value, limit, offset, fields=None, page_size=1000):
+        # every page takes the read lock on its own, so writers aren't blocked between pages
+        cursor = None
+        while limit is None or limit > 0:
+            page = self.page(field, value, page_size, cursor)
+            items = page.items[offset:]
+            offset = max(0, offset - len(page.items))
+            if limit is not None:
+                items = items[:limit]
+                limit -= len(items)
+            if fields is not None:
+                items = [project(item, fields) for item in items]
+            yield from items
+            if page.cursor is None:
+                return
+            cursor = page.cursor
+
+    @read_locked
+    def count(self, field, value):
+        """ Return number of matched items without building the result
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            :return: (int)
+        """
+        positions = self.__positions(field, value)
+        if self.instrumentation is not None:
+            self.__observe_rows('count', field, len(positions), len(positions))
+        return len(positions)
+
+    @read_locked
+    def page(self, field, value, limit=100, cursor=None):
+        """ Return one page of filter results with a keyset cursor, the cursor holds the
+            position of the last returned row, so next pages don't rescan previous ones
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            limit: (int) number of items of the page
+            cursor: (str) cursor of the previous page, None for the first page
+            :return: Page
+        """
+        assert isinstance(limit, int) and limit >= 1, "limit must be a positive integer"
+        after = -1 if cursor is None else decode_cursor(cursor, field, value, self.__generation)
+        positions = list(islice(self.__iter_positions(field, value, after), limit + 1))
+        next_cursor = None
+        if len(positions) > limit:
+            positions = positions[:limit]
+            next_cursor = encode_cursor(field, value, positions[-1], self.__generation)
+        if self.instrumentation is not None:
+            self.__observe_rows('page', field, len(positions), len(positions), after + 1,
+                                positions[-1] if next_cursor else None)
+        return Page([self.__data[position] for position in positions], next_cursor)
 
     @staticmethod
     def exists(source, key, value):
@@ -108,10 +450,13 @@ class JSONDB(BaseDB):
 
         return False
 
+    @read_locked
     def fields(self):
-        """Return fields (or columns)"""
-        return self.__fields
+        """Return schema of fields (or columns), it's used like a set of field names"""
+        # a copy, so inserts of other threads don't change it while it's iterated
+        return self.__schema.copy()
 
+    @read_locked
     def get(self, field, value):
         """ Get first matched value
             field: (str) field to apply filter based on it
@@ -120,22 +465,462 @@ class JSONDB(BaseDB):
         """
         assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
 
-        if field not in self.__fields:
+        if field not in self.__schema:
             raise FieldNotFoundError()
 
-        for item in self.__data:
-            if self.exists(item, field, value):
-                return item
+        index = self.index(field)
+        match = self.__schema[field].matcher(value) if index is None else None
+        if index is None and match is not None:
+            for position, item in enumerate(self.__data):
+                if item is not None and match(item):
+                    if self.instrumentation is not None:
+                        self.__observe_rows('get', field, 1, 1, last=position)
+                    return item
+        if index is None:
+            if self.instrumentation is not None:
+                self.__observe_rows('get', field, 0, 0)
+            return None
+
+        positions = index.lookup(value)
+        if self.instrumentation is not None:
+            self.__observe_rows('get', field, min(len(positions), 1), min(len(positions), 1))
+        if positions:
+            return self.__data[positions[0]]
         return None
 
-    @staticmethod
-    def convert_file_path_to_json(file_path):
-        """Converts json_file path to python list"""
+    def __built_indexes(self):
+        yield from self.__indexes.values()
+        yield from self.__range_indexes.values()
+        yield from self.__text_indexes.values()
+        yield from self.__lookup_indexes.values()
+        yield from self.__counts.values()
+
+    def __apply(self, operation):
+        """Apply a logged write operation, return number of changed rows"""
+        self.version += 1
+        if operation['op'] == INSERT:
+            item = operation['item']
+            position = len(self.__data)
+            self.__data.append(item)
+            self.__schema.observe(item)
+            for index in self.__built_indexes():
+                index.add(position, item)
+            return 1
+
+        positions = list(self.__positions(operation['field'], operation['value']))
+        for position in positions:
+            item = self.__data[position]
+            for index in self.__built_indexes():
+                index.remove(position, item)
+
+            if operation['op'] == UPDATE:
+                # rows are replaced rather than changed, so readers holding them aren't affected
+                item = {**item, **operation['changes']}
+                self.__schema.observe(operation['changes'], row=False)
+                for index in self.__built_indexes():
+                    index.add(position, item)
+            else:
+                item = None
+                self.__deleted += 1
+            self.__data[position] = item
+        return len(positions)
+
+    def __write(self, operation):
+        if self.__retired:
+            raise DatabaseIsReloadedError()
+        if self.__wal is not None:
+            self.__wal.append(operation)
+        return self.__apply(operation)
+
+    @write_locked
+    def insert(self, item):
+        """ Add a new item and every built index
+            item: (dict) new item
+            :return: inserted item
+        """
+        if not isinstance(item, dict):
+            raise DataIsInvalidError()
+        self.__write({'op': INSERT, 'item': item})
+        return item
+
+    @write_locked
+    def update(self, field, value, changes):
+        """ Change fields of matched items, only indexes of those items are updated
+            field: (str) field to match items based on it
+            value: (str, int, bool) value to match items based on it
+            changes: (dict) new values of fields
+            :return: (int) number of updated items
+        """
+        if not isinstance(changes, dict):
+            raise DataIsInvalidError()
+        # validate the match before it is logged
+        self.__positions(field, value)
+        return self.__write({'op': UPDATE, 'field': field, 'value': value, 'changes': changes})
+
+    @write_locked
+    def delete(self, field, value):
+        """ Remove matched items, only indexes of those items are updated
+            field: (str) field to match items based on it
+            value: (str, int, bool) value to match items based on it
+            :return: (int) number of deleted items
+        """
+        self.__positions(field, value)
+        return self.__write({'op': DELETE, 'field': field, 'value': value})
+
+    @write_locked
+    def compact(self):
+        """ Write current items to the source json file, clear its write-ahead log and
+            rebuild indexes without positions of deleted items
+        """
+        if self.__retired:
+            raise DatabaseIsReloadedError()
+        data = [item for item in self.__data if item is not None]
+        if self.__wal is not None:
+            temporary_path = f'{self.__source}.tmp'
+            with open(temporary_path, 'w') as json_file:
+                json.dump(data, json_file)
+            os.replace(temporary_path, self.__source)
+            self.__wal.truncate(log_key(self.__source))
+        self.process_data(data)
+        self.__data = data
+        self.__deleted = 0
+        self.version += 1
+        self.__generation += 1
+
+    @write_locked
+    def catch_up(self):
+        """ Replay operations that were logged by another db of the same source since the log was replayed,
+            when the source was regenerated they're logged again in a new log of this version of it
+        """
+        if self.__wal is not None:
+            for operation in list(self.__wal.replay(self.__wal.replayed, catch_up=True)):
+                if self.__wal.stale:
+                    self.__wal.append(operation)
+                self.__apply(operation)
+
+    @write_locked
+    def hand_over(self, db, swap):
+        """ Pass writes on to db, a reload of the same source: writes to this db wait while db catches
+            up with the log and swap() puts it in place, after that they raise DatabaseIsReloadedError
+            db: (JSONDB) db that takes the place of this one
+            swap: (callable) puts db in place
+        """
+        db.catch_up()
+        swap()
+        self.__retired = True
+        if self.__wal is not None:
+            self.__wal.close()
+
+    @read_locked
+    def scan(self, expression, workers=None):
+        """ Apply a query with a full scan split over worker processes, for predicates
+            no index can answer such as words of description
+            expression: (str or Predicate) query expression
+            workers: (int) number of processes, as default the number of cores
+            :return: list of matched items in dataset order
+        """
+        predicate = parse(expression)
+        for field in predicate.fields():
+            if field not in self.__schema:
+                raise FieldNotFoundError()
+
+        # reads run concurrently, so the shared scanner is replaced under its own lock and a
+        # replaced one is closed when the scans still using it finish
+        with self.__scanner_lock:
+            scanner = self.__scanner
+            if scanner is None or scanner[0] != self.version or (workers and scanner[1].workers != workers):
+                if scanner is not None:
+                    scanner[1].retire()
+                # shards are written once per version of the data and reused by next scans
+                scanner = self.__scanner = (self.version, ShardedScanner(self.__data, workers))
+            scanner = scanner[1]
+            scanner.acquire()
         try:
-            with open(file_path) as json_file:
-                return json.load(json_file)
-        except Exception as e:
-            raise DataIsNotJSONError()
+            positions = scanner.scan(predicate)
+        finally:
+            scanner.release()
+        return [self.__data[position] for position in positions]
+
+    @read_locked
+    def __len__(self):
+        return len(self.__data) - self.__deleted
+
+    def index(self, field):
+        """ Return index of the field, building it when the policy allows
+            field: (str) indexed field
+            :return: HashIndex or None when indexing of the field is off
+        """
+        index = self.__indexes.get(field)
+        if index is None and self.__index_policy.mode(field) != OFF:
+            with self.__build_lock:
+                index = self.__indexes.get(field)
+                if index is None:
+                    index = HashIndex.build(field, self.__data)
+                    self.__indexes = {**self.__indexes, field: index}
+        return index
+
+    def has_index(self, field):
+        """Return whether the hash index of the field is already built"""
+        return field in self.__indexes
+
+    def range_index(self, field):
+        """ Return sorted range index of the field, building it when the policy allows
+            field: (str) timestamp field
+            :return: SortedIndex or None when indexing of the field is off
+        """
+        index = self.__range_indexes.get(field)
+        if index is None and self.__index_policy.mode(field) != OFF:
+            with self.__build_lock:
+                index = self.__range_indexes.get(field)
+                if index is None:
+                    index = SortedIndex.build(field, self.__data)
+                    self.__range_indexes = {**self.__range_indexes, field: index}
+        return index
+
+    def lookup_index(self, field):
+        """ Return prefix, case-insensitive and fuzzy lookup index of the field, building it
+            when the policy allows
+            field: (str) string field (or list of strings field)
+            :return: LookupIndex or None when indexing of the field is off
+        """
+        index = self.__lookup_indexes.get(field)
+        if index is None and self.__index_policy.mode(field) != OFF:
+            with self.__build_lock:
+                index = self.__lookup_indexes.get(field)
+                if index is None:
+                    index = LookupIndex.build(field, self.__data)
+                    self.__lookup_indexes = {**self.__lookup_indexes, field: index}
+        return index
+
+    @read_locked
+    def typeahead(self, field, text, mode='prefix', limit=10):
+        """ Return items whose string field (or a string of a list field) matches typed text
+            field: (str) field to search
+            text: (str) typed text, case is ignored
+            mode: (str) 'exact' equal text, 'prefix' a word of the value starts with text,
+                  'fuzzy' close to text (misspelled or partial), best matches first
+            limit: (int) maximum number of items
+            :return: list of items
+        """
+        assert isinstance(text, str), "text must be string type"
+        assert mode in TYPEAHEAD_MODES, "mode must be exact, prefix or fuzzy"
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        index = self.lookup_index(field)
+        if index is None:
+            # indexing of the field is off, the rows are indexed for this query only
+            index = LookupIndex.build(field, self.__data)
+        positions = index.exact(text)[:limit] if mode == 'exact' else getattr(index, mode)(text, limit)
+        return [self.__data[position] for position in positions]
+
+    @read_locked
+    def between(self, field, start=None, end=None, include_start=True, include_end=True):
+        """ Return items whose timestamp field is between start and end, ordered by time
+            field: (str) timestamp field such as created_at
+            start: (str, datetime, int, float) lower bound, None for no bound
+            end: (str, datetime, int, float) upper bound, None for no bound
+            :return: list of matched items
+        """
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        index = self.range_index(field)
+        if index is None:
+            index = SortedIndex.build(field, self.__data)
+        return [self.__data[position] for position in index.range(start, end, include_start, include_end)]
+
+    def __text_fields(self, fields):
+        for field in fields:
+            if field not in self.__schema:
+                raise FieldNotFoundError()
+        return tuple(fields)
+
+    def __default_text_fields(self):
+        return tuple(field for field in self.__index_policy.text or TEXT_FIELDS if field in self.__schema)
+
+    @read_locked
+    def search(self, text, fields=None, limit=10):
+        """ Full-text search ranked with BM25
+            text: (str) words and quoted phrases, e.g. 'korea "a catastrophe"'
+            fields: (list) text fields to search in, as default the policy text fields or
+                    the known ones among subject, description, signature, name and details
+            limit: (int) number of returned items
+            :return: list of matched items, best first
+        """
+        fields = self.__default_text_fields() if fields is None else self.__text_fields(fields)
+        if not fields:
+            return []
+
+        index = self.__text_indexes.get(fields)
+        if index is None:
+            with self.__build_lock:
+                index = self.__text_indexes.get(fields)
+                if index is None:
+                    index = FullTextIndex.build(fields, self.__data)
+                    self.__text_indexes = {**self.__text_indexes, fields: index}
+        return [self.__data[position] for _, position in index.search(text, limit)]
+
+    @read_locked
+    def index_stats(self):
+        """ Return size information of built indexes keyed by field,
+            range indexes as 'field:range' and full-text indexes as 'field,field:text'
+        """
+        stats = {field: index.stats() for field, index in self.__indexes.items()}
+        stats.update({f'{field}:range': index.stats() for field, index in self.__range_indexes.items()})
+        stats.update({','.join(fields) + ':text': index.stats() for fields, index in self.__text_indexes.items()})
+        stats.update({f'{field}:lookup': index.stats() for field, index in self.__lookup_indexes.items()})
+        stats.update({f'{field}:counts': index.stats() for field, index in self.__counts.items()})
+        return stats
+
+    @read_locked
+    def group_by(self, field):
+        """ Return number of rows per value of the field, rows with list values count once
+            per distinct element (e.g. tag frequency). Bucket sizes of the hash index of the
+            field are used when it's built, otherwise counts are materialized on the first call
+            and writes keep them up to date
+            field: (str) grouped field
+            :return: dictionary of value to number of rows
+        """
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+        index = self.__count_index(field)
+        if index is None:
+            with self.__build_lock:
+                index = self.__count_index(field)
+                if index is None:
+                    index = CountIndex.build(field, self.__data)
+                    self.__counts = {**self.__counts, field: index}
+        return index.counts()
+
+    def __count_index(self, field):
+        """Return built hash index or materialized counts of the field, both have counts()"""
+        index = self.__indexes.get(field)
+        return index if index is not None else self.__counts.get(field)
+
+    @read_locked
+    def min(self, field):
+        """ Return the smallest number or earliest timestamp of the field
+            field: (str) numeric or timestamp field
+            :return: value as stored in the row, None when no row has one
+        """
+        return self.__extreme(field, largest=False)
+
+    @read_locked
+    def max(self, field):
+        """ Return the largest number or latest timestamp of the field
+            field: (str) numeric or timestamp field
+            :return: value as stored in the row, None when no row has one
+        """
+        return self.__extreme(field, largest=True)
+
+    def __extreme(self, field, largest):
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+        pick = max if largest else min
+
+        types = self.__schema[field].types
+        if types & {'int', 'float'}:
+            # keys of an index or of counts are the distinct values, so rows aren't read, but they
+            # only hold values as they are for int fields (floats are dropped, 1 and True merged)
+            index = self.__count_index(field) if types == {'int'} else None
+            values = index.counts() if index is not None else (
+                item.get(field) for item in self.__data if item is not None)
+            return pick((value for value in values if type(value) in {int, float}), default=None)
+
+        index = self.range_index(field)
+        if index is not None:
+            bounds = index.bounds()
+            return self.__data[bounds[largest]][field] if bounds is not None else None
+        # range indexing of the field is off, every timestamp is parsed once
+        key_of = SortedIndex(field).key_of
+        keyed = ((key_of(item), item[field]) for item in self.__data if item is not None)
+        return pick(((key, value) for key, value in keyed if key is not None),
+                    key=lambda pair: pair[0], default=(None, None))[1]
+
+    @read_locked
+    def query(self, expression, fields=None):
+        """ Apply compound query
+            expression: (str or Predicate) e.g. 'status = "open" AND tags CONTAINS "Ohio"'
+            fields: (list) fields of returned items, None for whole items
+            :return: list of matched items in dataset order
+        """
+        if fields is not None:
+            self.__check_fields(fields)
+        _, positions, _ = Planner(self.__data, self.__schema, self.index).execute(parse(expression))
+        return self.__items(positions, fields)
+
+    @read_locked
+    def export(self, target, format='jsonl', field=None, value=None, fields=None):
+        """ Write matched items, or all of them without a field, straight from the stored rows,
+            the result is never built as a list; writers wait until the export finishes
+            target: (str or file) path, or file opened in text mode (binary mode for columnar)
+            format: (str) 'jsonl', 'csv' or 'columnar', see database.export
+            field: (str) field to match items based on it, None for all items
+            value: (str, int, bool) value to match items based on it
+            fields: (list) exported fields, as default every field (whole items for jsonl)
+            :return: (int) number of exported items
+        """
+        if fields is not None:
+            self.__check_fields(fields)
+        elif format != 'jsonl':
+            fields = list(self.__schema)
+
+        data = self.__data
+        if field is None:
+            rows = (item for item in data if item is not None)
+        else:
+            rows = map(data.__getitem__, self.__iter_positions(field, value))
+        return export(rows, target, format, fields)
+
+    @read_locked
+    def explain(self, expression):
+        """ Run compound query and describe the chosen plan
+            expression: (str or Predicate) query expression
+            :return: (str) plan with estimated and examined rows
+        """
+        return Planner(self.__data, self.__schema, self.index).explain(parse(expression))
+
+    @read_locked
+    def snapshot_state(self):
+        """Return data, schema and built indexes"""
+        return {
+            'data': self.__data,
+            'schema': self.__schema,
+            'indexes': self.__indexes,
+            'range_indexes': self.__range_indexes,
+            'text_indexes': self.__text_indexes,
+            'counts': self.__counts,
+            'lookup_indexes': self.__lookup_indexes,
+            'deleted': self.__deleted,
+            'source': self.__source,
+            'wal_offset': self.__wal.size() if self.__wal is not None else 0,
+        }
+
+    @write_locked
+    def restore_state(self, state):
+        """Restore data, schema and indexes of a snapshot"""
+        self.__data = state['data']
+        # snapshots written before schemas were inferred only hold field names
+        self.__schema = state.get('schema') or Schema.infer(item for item in self.__data if item is not None)
+        self.__indexes = state['indexes']
+        self.__range_indexes = state.get('range_indexes', {})
+        self.__text_indexes = state.get('text_indexes', {})
+        self.__counts = state.get('counts', {})
+        self.__lookup_indexes = state.get('lookup_indexes', {})
+        self.__deleted = state.get('deleted', 0)
+        self.version += 1
+        self.__generation += 1
+        # writes logged after the snapshot was taken are replayed on top of it
+        self.__open_wal(state.get('source'), state.get('wal_offset', 0))
+
+    @staticmethod
+    def convert_file_path_to_json(file_path, decoder=None):
+        """ Converts json_file path to python list
+            decoder: (Decoder or str) see database.decoders, the stdlib one as default
+            :return: decoded data, DataIsNotJSONError tells why it couldn't be decoded
+        """
+        return get_decoder(decoder).load(file_path)
 
 
 class Database:
@@ -144,37 +929,320 @@ class Database:
         any type of database (as default it's connected to JSON type DB)
     """
 
-    def __init__(self):
-        self.db = None
+    # every db swapped into any Database gets a new generation, so cached results are never shared
+    __generations = itertools.count(1)
+
+    def __init__(self, cache=None, instrumentation=None):
+        """ cache: (QueryCache) cache of get/filter results, may be shared by several databases
+            instrumentation: (Instrumentation) metrics of operations, see database.instrumentation
+        """
+        assert cache is None or isinstance(cache, QueryCache), "cache must be a QueryCache"
+        self.__db = None
+        self.__generation = 0
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.load_seconds = None
+        self.source = None
+        self.watcher = None
+        self.__snapshot = False
 
-    def connect(self, source, db=None):
+    @property
+    def db(self):
+        return self.__db
+
+    @db.setter
+    def db(self, db):
+        if db is not None:
+            db.instrumentation = self.instrumentation
+        self.__db = db
+        self.__generation = next(Database.__generations)
+
+    def __entity(self):
+        return self.source if isinstance(self.source, str) else 'memory:%d' % id(self)
+
+    def __cached(self, method, field, value):
+        """ Answer get/filter from the cache, the cached version is the generation of the db
+            and the version its writes and add_data change
+        """
+        db = self.__db
+        version = (self.__generation, getattr(db, 'version', None))
+        key = self.cache.key(self.__entity(), method, field, value)
+        found, result = self.cache.lookup(key, version)
+        if self.instrumentation is not None:
+            self.instrumentation.lookup('cache', found)
+        if not found:
+            result = getattr(db, method)(field, value)
+            # only materialized results are cached, a generator (e.g. of StreamingJSONDB) is read once
+            if result is None or isinstance(result, (list, dict)):
+                self.cache.store(key, version, result)
+        # callers may change the returned list
+        return list(result) if isinstance(result, list) else result
+
+    def connect(self, source, db=None, index_policy=None, snapshot=False, decoder=None, state=None):
         """ Connect to data and initialize db
             source: (list of dictionaries, or string path to source)
             db: Concrete class that is extended from BaseDB.
-            :return: instance
+            index_policy: (IndexPolicy) when to build field indexes of the default JSONDB
+            snapshot: (bool) load the binary snapshot of a source path instead of parsing it
+                      when it is up to date, otherwise parse and write the snapshot, snapshots
+                      are pickles, see database.snapshot for which ones are trusted
+            decoder: (Decoder or str) decoder of json files of the default JSONDB, e.g. 'orjson'
+            state: (dict) snapshot_state of a db that already loaded the source (e.g. in another
+                   process), it's restored instead of loading the source again
+            :return: instance, load_seconds tells how long loading took
         """
+        start = time.perf_counter()
         if db is None:
-            db = JSONDB()
+            db = JSONDB(index_policy=index_policy, decoder=decoder)
 
+        if state is not None:
+            db.instrumentation = self.instrumentation
+            db.restore_state(state)
+        else:
+            db = self.__load(source, db, snapshot)
         self.db = db
-        self.db.add_data(source)
+        self.source = source
+        self.__snapshot = snapshot
+        self.load_seconds = time.perf_counter() - start
         return self
 
+    def instrument(self, instrumentation):
+        """ Start (or stop with None) collecting metrics of operations
+            instrumentation: (Instrumentation) see database.instrumentation
+        """
+        self.instrumentation = instrumentation
+        if self.db is not None:
+            self.db.instrumentation = instrumentation
+        return self
+
+    def __load(self, source, db, snapshot):
+        db.instrumentation = self.instrumentation
+        if snapshot and isinstance(source, str):
+            self.__connect_snapshot(source, db)
+        else:
+            db.add_data(source)
+        return db
+
+    @required_connection
+    def load(self):
+        """ Load the connected source into a new db without swapping it in
+            :return: db of the same kind as the connected one
+        """
+        return self.__load(self.source, self.db.new_empty(), self.__snapshot)
+
+    @required_connection
+    def swap(self, db):
+        """ Put a db returned by load() in place of the connected one, writes made to the connected
+            JSONDB since load() are replayed on the new one first and later writes go to it
+            db: db returned by load()
+        """
+        current = self.db
+        if isinstance(current, JSONDB) and isinstance(db, JSONDB) and current is not db:
+            current.hand_over(db, lambda: setattr(self, 'db', db))
+        else:
+            self.db = db
+
+    @required_connection
+    def watch(self, interval=1.0):
+        """ Reload the source file in a background thread whenever it changes
+            interval: (float) seconds between two polls of the file
+            :return: SourceWatcher whose metrics() show reload and query latency
+        """
+        if self.watcher is None:
+            self.watcher = SourceWatcher(self, interval).start()
+        return self.watcher
+
+    def unwatch(self):
+        """Stop watching the source file"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    @staticmethod
+    def __connect_snapshot(source, db):
+        snapshot = load_snapshot(source)
+        try:
+            if snapshot is not None and snapshot['db'] == type(db).__name__:
+                db.restore_state(snapshot['state'])
+                return
+            # the key of the file that is parsed, it may change while it's parsed
+            try:
+                key = source_key(source)
+            except OSError:
+                key = None
+            db.add_data(source)
+            write_snapshot(source, {'db': type(db).__name__, 'state': db.snapshot_state()}, key)
+        except NotImplementedError:
+            # db doesn't support snapshots
+            db.add_data(source)
+
+    @required_connection
+    def save_snapshot(self):
+        """ Write snapshot of the connected source including indexes built since connecting
+            :return: (bool) whether the snapshot was written
+        """
+        assert isinstance(self.source, str), "only sources connected by path have snapshots"
+        return write_snapshot(self.source, {'db': type(self.db).__name__, 'state': self.db.snapshot_state()})
+
     def is_db_connected(self):
         """Check whether db is connected to appropriate source"""
         return not (self.db is None)
 
     @required_connection
-    def filter(self, field, value):
-        """ return filtered list based on matched result """
-        return self.db.filter(field, value)
+    def filter(self, field, value, **options):
+        """ return filtered list based on matched result,
+            JSONDB also accepts limit, offset, lazy and fields options
+        """
+        if self.cache is not None and not options:
+            return self.__cached('filter', field, value)
+        watcher = self.watcher
+        if watcher is None or not watcher.reloading:
+            return self.db.filter(field, value, **options)
+        start = time.perf_counter()
+        result = self.db.filter(field, value, **options)
+        watcher.observe_query(time.perf_counter() - start)
+        return result
+
+    @required_connection
+    def count(self, field, value):
+        """ return number of matched items """
+        return self.db.count(field, value)
+
+    @required_connection
+    def page(self, field, value, limit=100, cursor=None):
+        """ return one page of matched items and the cursor of the next one """
+        return self.db.page(field, value, limit, cursor)
+
+    @required_connection
+    def filter_many(self, field, values):
+        """ return filtered lists grouped by each of the values """
+        return self.db.filter_many(field, values)
+
+    @required_connection
+    def query(self, expression, **options):
+        """ return items matching a compound query expression or predicate,
+            JSONDB also accepts the fields option
+        """
+        return self.db.query(expression, **options)
+
+    @required_connection
+    def export(self, target, format='jsonl', field=None, value=None, fields=None):
+        """ write matched (or all) items to a JSON Lines, CSV or columnar file and return their number """
+        return self.db.export(target, format, field, value, fields)
+
+    @required_connection
+    def explain(self, expression):
+        """ return description of the plan of a compound query """
+        return self.db.explain(expression)
+
+    @required_connection
+    def insert(self, item):
+        """ add a new item """
+        return self.__write('insert', item)
+
+    @required_connection
+    def update(self, field, value, changes):
+        """ change fields of matched items and return their number """
+        return self.__write('update', field, value, changes)
+
+    @required_connection
+    def delete(self, field, value):
+        """ remove matched items and return their number """
+        return self.__write('delete', field, value)
+
+    def __write(self, method, *args):
+        try:
+            return getattr(self.db, method)(*args)
+        except DatabaseIsReloadedError:
+            # the write waited for a reload that swapped in a new db, it's written there
+            return getattr(self.db, method)(*args)
+
+    @required_connection
+    def scan(self, expression, workers=None):
+        """ return items matching a query expression, scanned by worker processes """
+        return self.db.scan(expression, workers)
+
+    @required_connection
+    def parallel_filter(self, field, value, workers=None):
+        """ return filtered list scanned by worker processes instead of an index """
+        return self.db.scan(Eq(field, value), workers)
+
+    @required_connection
+    def search(self, text, fields=None, limit=10):
+        """ return items matching words and quoted phrases, best first """
+        return self.db.search(text, fields, limit)
+
+    @required_connection
+    def between(self, field, start=None, end=None):
+        """ return items whose timestamp field is between start and end (inclusive) """
+        return self.db.between(field, start, end)
+
+    @required_connection
+    def before(self, field, moment):
+        """ return items whose timestamp field is earlier than moment """
+        return self.db.before(field, moment)
+
+    @required_connection
+    def after(self, field, moment):
+        """ return items whose timestamp field is later than moment """
+        return self.db.after(field, moment)
+
+    @required_connection
+    def typeahead(self, field, text, mode='prefix', limit=10):
+        """ return items whose string field matches typed text exactly, by prefix or fuzzily,
+            case is ignored
+        """
+        return self.db.typeahead(field, text, mode, limit)
+
+    @required_connection
+    def suggest(self, field, text, limit=10):
+        """ return items matching typed text, exact matches first, then prefix and fuzzy ones """
+        return self.db.suggest(field, text, limit)
+
+    @required_connection
+    def group_by(self, field):
+        """ return number of items per value of the field """
+        return self.db.group_by(field)
+
+    @required_connection
+    def distinct(self, field):
+        """ return distinct values of the field """
+        return self.db.distinct(field)
+
+    @required_connection
+    def top_k(self, field, k=10):
+        """ return the k most frequent values of the field with their number of items """
+        return self.db.top_k(field, k)
+
+    @required_connection
+    def min(self, field):
+        """ return the smallest number or earliest timestamp of the field """
+        return self.db.min(field)
+
+    @required_connection
+    def max(self, field):
+        """ return the largest number or latest timestamp of the field """
+        return self.db.max(field)
 
     @required_connection
     def fields(self):
-        """ return fields list"""
+        """ return schema of fields, a dictionary of field name to FieldSchema"""
         return self.db.fields()
 
     @required_connection
     def get(self, field, value):
         """ Return matched item"""
-        return self.db.get(field, value)
+        if self.cache is not None:
+            return self.__cached('get', field, value)
+        watcher = self.watcher
+        if watcher is None or not watcher.reloading:
+            return self.db.get(field, value)
+        start = time.perf_counter()
+        result = self.db.get(field, value)
+        watcher.observe_query(time.perf_counter() - start)
+        return result
+
+    @required_connection
+    def index_stats(self):
+        """ Return which indexes exist and how much memory they use"""
+        return self.db.index_stats()
@@ -0,0 +1,146 @@
+import json
+from .exceptions import *
+from .source import BaseDB, JSONDB
+from .schema import Schema
+
+WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(file_path, chunk_size=64 * 1024):
+    """ Parse top-level JSON array of a file one element at a time
+        file_path: (str) path of the json file
+        chunk_size: (int) number of characters read from the file at once
+        :return: generator of parsed elements
+    """
+    decoder = json.JSONDecoder()
+    try:
+        json_file = open(file_path)
+    except Exception:
+        raise DataIsNotJSONError()
+
+    with json_file:
+        buffer = ''
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = json_file.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in WHITESPACE:
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        skip_whitespace()
+        if buffer[position:position + 1] != '[':
+            raise DataIsNotJSONError()
+        position += 1
+
+        expect_item = True
+        while True:
+            skip_whitespace()
+            if position >= len(buffer):
+                raise DataIsNotJSONError()
+
+            char = buffer[position]
+            if char == ']':
+                return
+            if char == ',':
+                if expect_item:
+                    raise DataIsNotJSONError()
+                expect_item = True
+                position += 1
+                continue
+            if not expect_item:
+                raise DataIsNotJSONError()
+
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise DataIsNotJSONError()
+                    fill()
+                    continue
+                # a value that ends the buffer (e.g. a number) may continue in the next chunk
+                if end == len(buffer) and not eof:
+                    fill()
+                    continue
+                break
+
+            position = end
+            expect_item = False
+            yield item
+
+
+class StreamingJSONDB(BaseDB):
+    """
+        This class navigates through a JSON file without keeping it in memory,
+        every query streams the file again, so memory usage doesn't grow with its size
+    """
+
+    def __init__(self, chunk_size=64 * 1024) -> None:
+        self.__source = None
+        self.__schema = Schema()
+        self.__chunk_size = chunk_size
+
+    def new_empty(self):
+        """Return a new db without a source and with the chunk size of this one"""
+        return type(self)(chunk_size=self.__chunk_size)
+
+    def add_data(self, data):
+        """ Store source of data and discover its fields.
+            data: (list or str) list of dictionaries or json path string
+        """
+        self.process_data(self.__iter_source(data))
+        self.__source = data
+
+    def process_data(self, data):
+        """ Validate received data and infer its schema, rows are read one at a time"""
+        self.__schema = Schema.infer_rows(data)
+
+    def __iter_source(self, source):
+        if isinstance(source, list):
+            return iter(source)
+        if not isinstance(source, str):
+            raise DataIsNotJSONError()
+        return iter_json_array(source, self.__chunk_size)
+
+    def filter(self, field, value):
+        """ Apply filtering
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            :return: generator of matched items
+        """
+        assert type(value) in {int, str, bool}, "value must string, integer or boolean type"
+
+        if field not in self.__schema:
+            raise FieldNotFoundError()
+
+        return (item for item in self.__iter_source(self.__source) if JSONDB.exists(item, field, value))
+
+    def fields(self):
+        """Return schema of fields (or columns), it's used like a set of field names"""
+        return self.__schema
+
+    def get(self, field, value):
+        """ Get first matched value
+            field: (str) field to apply filter based on it
+            value: (str, int, bool) value to apply filter based on it
+            :return: dictionary
+        """
+        matches = self.filter(field, value)
+        try:
+            return next(matches, None)
+        finally:
+            # close the generator so the file is released right away
+            matches.close()
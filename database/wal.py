@@ -0,0 +1,120 @@
+import json, os
+
+WAL_EXTENSION = '.wal'
+
+# write operations
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+def wal_path(source):
+    """Return path of the write-ahead log stored next to the source file"""
+    return source + WAL_EXTENSION
+
+
+def log_key(source):
+    """ Key of the version of the source file that logged writes apply to
+        source: (str) path of the source file
+        :return: list of modification time and size, None when the file can't be read
+    """
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class WriteAheadLog:
+    """
+        Append-only log of write operations stored as JSON lines next to the source file,
+        replaying it on top of the source rebuilds the latest state of the dataset
+        * the first line is a header with the log_key of the source the writes apply to, a log
+          of another version of the source (e.g. a regenerated file) isn't replayed and the
+          next write moves it aside to '<source>.wal.old'
+    """
+
+    def __init__(self, source, durable=False, key=None) -> None:
+        """ source: (str) path of the source file
+            durable: (bool) fsync after every operation instead of only flushing it
+            key: (list) log_key of the loaded version of the source, taken before it was read,
+                 as default the current one
+        """
+        self.path = wal_path(source)
+        self.durable = durable
+        self.key = key or log_key(source)
+        # byte offset right after the last replayed operation
+        self.replayed = 0
+        # whether the log belongs to another version of the source
+        self.stale = False
+        self.__file = None
+
+    def append(self, operation):
+        """ Append an operation to the log
+            operation: (dict) e.g. {'op': 'insert', 'item': {...}}
+        """
+        if self.stale:
+            self.rotate()
+        if self.__file is None:
+            self.__file = open(self.path, 'a', encoding='utf-8')
+            if self.__file.tell() == 0:
+                self.__file.write(json.dumps({'source': self.key}) + '\n')
+        self.__file.write(json.dumps(operation, separators=(',', ':')) + '\n')
+        self.__file.flush()
+        if self.durable:
+            os.fsync(self.__file.fileno())
+
+    def size(self):
+        """Return size of the log in bytes"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def replay(self, offset=0, catch_up=False):
+        """ Read operations of the log, operations of a stale log (one of another version of the
+            source, e.g. a regenerated file) are skipped, the log is rotated by the next append
+            offset: (int) byte offset to start from
+            catch_up: (bool) read operations of a stale log after offset too, the ones that the
+                      replaced db logged while this one was loaded
+            :return: generator of operations, a torn last line is ignored
+        """
+        self.replayed = offset
+        self.stale = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as log_file:
+            line = log_file.readline()
+            header = json.loads(line) if line.endswith(b'\n') else {}
+            # logs written before headers were added have none, they're replayed as they are
+            if 'source' in header:
+                self.stale = header['source'] != self.key
+                self.replayed = max(offset, len(line))
+            log_file.seek(self.replayed)
+            for line in log_file:
+                if not line.endswith(b'\n'):
+                    # the process stopped while writing this operation
+                    return
+                self.replayed += len(line)
+                if catch_up or not self.stale:
+                    yield json.loads(line)
+
+    def truncate(self, key=None):
+        """ Remove all operations of the log
+            key: (list) log_key of the source the next operations apply to, e.g. after it's rewritten
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.stale = False
+        if key is not None:
+            self.key = key
+
+    def rotate(self):
+        """Move the log aside to '<source>.wal.old', the next operation starts a new log"""
+        self.close()
+        if os.path.exists(self.path):
+            os.replace(self.path, self.path + '.old')
+        self.stale = False
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
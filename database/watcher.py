@@ -0,0 +1,130 @@
+import os, threading, time
+from collections import deque
+
+
+class LatencyRecorder:
+    """
+        Keeps the latest latency samples (in seconds) and summarizes them
+    """
+
+    def __init__(self, size=10000) -> None:
+        self.__samples = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, seconds):
+        """Record one latency sample"""
+        self.__samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """Return number of samples and p50, p99 and max latency in seconds"""
+        samples = sorted(self.__samples)
+        if not samples:
+            return {'count': self.count, 'p50': None, 'p99': None, 'max': None}
+        return {
+            'count': self.count,
+            'p50': samples[len(samples) // 2],
+            'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            'max': samples[-1],
+        }
+
+
+class SourceWatcher:
+    """
+        Polls modification time and size of the source file of a Database,
+        when it changes the source is loaded into a new db in a background thread
+        and swapped in with a single reference assignment, so queries that already
+        hold the old db keep reading a consistent snapshot
+    """
+
+    def __init__(self, database, interval=1.0) -> None:
+        """ database: (Database) connected database whose source is a file path
+            interval: (float) seconds between two polls
+        """
+        assert isinstance(database.source, str), "only sources connected by path can be watched"
+        self.database = database
+        self.interval = interval
+        self.reloading = False
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_reload_seconds = None
+        self.last_error = None
+        self.reload_latency = LatencyRecorder()
+        self.query_latency = LatencyRecorder()
+        self.__key = self.__source_key()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def __source_key(self):
+        try:
+            stat = os.stat(self.database.source)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        """Start polling in a daemon thread"""
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name='source-watcher', daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling and wait for the thread"""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """ Poll the source once and reload it when it changed
+            :return: (bool) whether a new snapshot was swapped in
+        """
+        key = self.__source_key()
+        if key is None or key == self.__key:
+            return False
+        return self.reload(key)
+
+    def reload(self, key=None):
+        """ Load the source into a new db and swap it in
+            :return: (bool) whether the reload succeeded, the old db is kept otherwise
+        """
+        self.reloading = True
+        start = time.perf_counter()
+        try:
+            db = self.database.load()
+        except Exception as e:
+            # the file may be in the middle of being written, the next poll retries
+            self.failed_reloads += 1
+            self.last_error = str(e) or type(e).__name__
+            return False
+        finally:
+            self.reloading = False
+
+        self.database.swap(db)
+        self.__key = key or self.__source_key()
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - start
+        self.reload_latency.observe(self.last_reload_seconds)
+        return True
+
+    def observe_query(self, seconds):
+        """Record latency of a query answered while a reload was running"""
+        self.query_latency.observe(seconds)
+
+    def metrics(self):
+        """Return reload and query latency metrics"""
+        return {
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'reloading': self.reloading,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_error': self.last_error,
+            'reload_latency': self.reload_latency.summary(),
+            'query_latency_during_reload': self.query_latency.summary(),
+        }
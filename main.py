@@ -1,6 +1,8 @@
 import os
-from database.source import Database
+from database.cache import QueryCache
+from database.loader import connect_all
 from database.exceptions import FieldNotFoundError
+from database.relations import Relations
 from constants import *
 from main_v2 import Graphic, BuxSize
 
@@ -34,14 +36,34 @@ def show_search_result(result):
         print("***** No result was found *******")
 
 
+def label(record):
+    """Describe a record by its name (or subject)"""
+    return str(record.get('name') or record.get('subject') or record.get('_id'))
+
+
+def related_summary(related):
+    """Describe related records of a result by their names (or subjects)"""
+    summary = {}
+    for name, records in related.items():
+        if isinstance(records, list):
+            summary[name] = ', '.join(label(record) for record in records) or '-'
+        else:
+            summary[name] = label(records) if records is not None else '-'
+    return summary
+
+
 if __name__ == "__main__":
 
-    # connecting to users, tickets, and organizations datasets
-    user_db = Database().connect(entities[USER])
-    ticked_db = Database().connect(entities[TICKET])
-    organization_db = Database().connect(entities[ORGANIZATION])
+    # connecting to users, tickets, and organizations datasets concurrently, repeated searches are cached
+    query_cache = QueryCache()
+    databases = connect_all(entities, cache=query_cache, snapshot=True)
+    user_db, ticked_db, organization_db = databases[USER], databases[TICKET], databases[ORGANIZATION]
+
+    relations_db = Relations({USER: user_db, TICKET: ticked_db, ORGANIZATION: organization_db}, relations)
 
     graphic = Graphic()
+    graphic.display({entity: f'{database.load_seconds:.3f}s' for entity, database in databases.items()},
+                    title='Load time', bux_size=BuxSize.SMALL)
 
     execute = True
 
@@ -50,8 +72,13 @@ if __name__ == "__main__":
         2: ticked_db,
         3: organization_db
     }
+    entity_options_dict = {
+        1: USER,
+        2: TICKET,
+        3: ORGANIZATION
+    }
 
-    main_options = ['Search Zendesk', 'View list of searchable fields', 'Quit']
+    main_options = ['Search Zendesk', 'View list of searchable fields', 'Full text search', 'Quit']
     entity_options = ['Users', 'Tickets', 'Organizations', 'Quit']
 
     while execute:
@@ -61,26 +88,32 @@ if __name__ == "__main__":
             option = int(input('select your option:'))
         except:
             os.system('cls' if os.name == 'nt' else 'clear')
-            graphic.display(str('Options can only be 1 or 2 or 3'), title='ERROR', bux_size=BuxSize.SMALL)
+            graphic.display(str('Options can only be 1 or 2 or 3 or 4'), title='ERROR', bux_size=BuxSize.SMALL)
             continue
 
         if option == 1:
             try:
                 os.system('cls' if os.name == 'nt' else 'clear')
                 graphic.display(entity_options, title='Select one option', bux_size=BuxSize.BIG)
-                option = int(input('select your option:'))
+                entity_option = int(input('select your option:'))
 
-                if option in {1, 2, 3}:
+                if entity_option in {1, 2, 3}:
                     field = str(input("Enter search term: "))
                     value = str(input("Enter searched_value: "))
 
-                    if value.isdigit():
-                        value = int(value)
-                    if value in {'true', 'false'}:
-                        value = True if value == 'true' else False
+                    # typed value is converted to the type of the field, e.g. '101' stays a string for str fields
+                    value = dbs_options_dict[entity_option].fields().coerce(field, value)
 
-                    result = dbs_options_dict[option].get(field, value)
+                    result = dbs_options_dict[entity_option].get(field, value)
+                    if result is None and isinstance(value, str):
+                        # misspelled or partly typed values are suggested
+                        suggestions = dbs_options_dict[entity_option].suggest(field, value, limit=5)
+                        if suggestions:
+                            graphic.display([label(suggestion) for suggestion in suggestions],
+                                            title='Did you mean', bux_size=BuxSize.BIG)
                     graphic.display(result=result, bux_size=BuxSize.BIG)
+                    related = relations_db.related(entity_options_dict[entity_option], result)
+                    graphic.display(result=related_summary(related), title='Related', bux_size=BuxSize.BIG)
                     continue
 
             except FieldNotFoundError as e:
@@ -97,4 +130,23 @@ if __name__ == "__main__":
             graphic.display(organization_db.fields(), title='Organizations Fields', bux_size=BuxSize.BIG)
 
         if option == 3:
+            try:
+                os.system('cls' if os.name == 'nt' else 'clear')
+                graphic.display(entity_options, title='Select one option', bux_size=BuxSize.BIG)
+                entity_option = int(input('select your option:'))
+
+                if entity_option in {1, 2, 3}:
+                    text = str(input('Enter words or "quoted phrases": '))
+                    results = dbs_options_dict[entity_option].search(text)
+                    if results:
+                        graphic.display([label(result) for result in results], title='Best matches',
+                                        bux_size=BuxSize.BIG)
+                        graphic.display(result=results[0], bux_size=BuxSize.BIG)
+                    else:
+                        graphic.display('No result was found', title='Result', bux_size=BuxSize.BIG)
+            except:
+                pass
+            continue
+
+        if option == 4:
             execute = False
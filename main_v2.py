@@ -1,6 +1,7 @@
 import os, enum
 from abc import ABC, abstractmethod
-from database.source import Database
+from database.cache import QueryCache
+from database.loader import connect_all
 from database.exceptions import FieldNotFoundError
 from constants import *
 
@@ -38,7 +39,7 @@ class Graphic:
             print(line)
 
     def show_content(self, result, size):
-        assert type(result) in {str, dict, list, set}
+        assert isinstance(result, (str, dict, list, set))
 
         lines = []
 
@@ -141,11 +142,14 @@ class Program(Runnable):
 
     def __init__(self):
         self.main_questions = MainQuestions()
+        # databases are connected by the program, not when the module is imported, parse processes
+        # of connect_all import the main module again
+        self.query_cache = QueryCache()
+        self.databases = connect_all(entities, cache=self.query_cache, snapshot=True)
+        self.user_db, self.ticked_db, self.organization_db = (
+            self.databases[USER], self.databases[TICKET], self.databases[ORGANIZATION])
 
     state = ProgramState.STOPPED
-    user_db = Database().connect(entities[USER])
-    ticked_db = Database().connect(entities[TICKET])
-    organization_db = Database().connect(entities[ORGANIZATION])
 
     def run(self):
         self.main_questions.run()
@@ -1,5 +1,20 @@
-import unittest, json
-from database.source import Database
+import asyncio, csv, unittest, json, os, shutil, subprocess, sys, tempfile, threading, time, tracemalloc
+from database.source import Database, JSONDB
+from database.index import IndexPolicy, parse_timestamp
+from database.stream import StreamingJSONDB, iter_json_array
+from database.columnar import ColumnarDB
+from database.snapshot import snapshot_path
+from database.relations import Relations
+from database.query import Eq, Contains, Compare, Prefix
+from database.wal import wal_path
+from database.concurrency import QueryExecutor, ReadWriteLock
+from database.aio import AsyncDatabase
+from database.cache import QueryCache, estimate_size
+from database.instrumentation import Instrumentation
+from database.decoders import DECODERS, available_decoders
+from database.loader import connect_all
+from database.export import export, read_columnar
+from constants import entities, relations, USER, TICKET, ORGANIZATION
 from database.exceptions import *
 
 EMPTY_LENGTH = 0
@@ -111,3 +126,793 @@ class TestDatabase(unittest.TestCase):
         """
         with self.assertRaises(DataIsNotJSONError):
             Database().connect(source=(2, 5))
+
+    def test_filter_matches_exists_semantics(self):
+        """Test to make sure indexed filter returns the same rows as scanning with exists()"""
+        data = [
+            {'_id': 1, 'active': True, 'tags': ['a', 'b', 'a']},
+            {'_id': 2, 'active': False, 'tags': ['b', 1]},
+            {'_id': 3, 'name': 'a', 'tags': [{'nested': 'a'}]},
+        ]
+        db = Database().connect(source=data)
+
+        for field, value in [('_id', 1), ('_id', True), ('active', 1), ('tags', 'a'),
+                             ('tags', 1), ('name', 'a'), ('_id', '1'), ('tags', 'c')]:
+            expected = [item for item in data if JSONDB.exists(item, field, value)]
+            self.assertEqual(db.filter(field, value), expected)
+
+    def test_index_policy(self):
+        """Test to make sure indexes are built eagerly, lazily or never based on the policy"""
+        policy = IndexPolicy(eager=['_id'], off=['description'])
+        db = Database().connect(source='data/tickets.json', index_policy=policy)
+        self.assertEqual(set(db.index_stats()), {'_id'})
+
+        self.assertNotEqual(len(db.filter('tags', 'Ohio')), EMPTY_LENGTH)
+        self.assertEqual(set(db.index_stats()), {'_id', 'tags'})
+
+        self.assertEqual(db.filter('description', 'not a description'), [])
+        self.assertNotIn('description', db.index_stats())
+
+        for stats in db.index_stats().values():
+            self.assertGreater(stats['memory'], 0)
+
+    def test_streaming_db(self):
+        """Test to make sure streaming db answers the same as in-memory db"""
+        with open('data/tickets.json') as json_file:
+            tickets = json.load(json_file)
+        self.assertEqual(list(iter_json_array('data/tickets.json', chunk_size=7)), tickets)
+
+        db = Database().connect(source='data/tickets.json', db=StreamingJSONDB(chunk_size=128))
+        self.assertEqual(db.fields(), self.ticket_db.fields())
+        self.assertEqual(list(db.filter('tags', 'Ohio')), self.ticket_db.filter('tags', 'Ohio'))
+        self.assertEqual(db.get('submitter_id', 38), self.ticket_db.get('submitter_id', 38))
+        with self.assertRaises(FieldNotFoundError):
+            db.filter('bad_field', 2)
+
+        # connecting reads the file row by row, so its peak memory doesn't grow with the file
+        peaks = []
+        with tempfile.TemporaryDirectory() as directory:
+            for scale in [20, 100]:
+                path = os.path.join(directory, f'tickets_{scale}.json')
+                with open(path, 'w') as json_file:
+                    json.dump(tickets * scale, json_file)
+                tracemalloc.start()
+                Database().connect(source=path, db=StreamingJSONDB())
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+        self.assertLess(peaks[1], 2 * 1024 * 1024)
+
+    def test_streaming_db_invalid_data(self):
+        """Test to make sure streaming db validates the file while discovering fields"""
+        with self.assertRaises(DataIsInvalidError):
+            Database().connect(source=[{'_id': 1}, 2], db=StreamingJSONDB())
+        with self.assertRaises(DataIsNotJSONError):
+            Database().connect(source='README.md', db=StreamingJSONDB())
+
+    def test_columnar_db(self):
+        """Test to make sure columnar db rebuilds rows and filters like JSONDB"""
+        for path, json_db in [('data/users.json', self.user_db), ('data/tickets.json', self.ticket_db),
+                              ('data/organizations.json', self.organization_db)]:
+            db = Database().connect(source=path, db=ColumnarDB())
+            self.assertEqual(db.fields(), json_db.fields())
+            for field, value in [('_id', 5), ('tags', 'Ohio'), ('active', True), ('status', 'hold'),
+                                 ('organization_id', 101), ('shared_tickets', 0), ('_id', '5')]:
+                if field in db.fields():
+                    self.assertEqual(db.filter(field, value), json_db.filter(field, value))
+                    self.assertEqual(db.get(field, value), json_db.get(field, value))
+
+        data = [{'a': 1.5, 'b': [1, True, None], 'c': None}, {'b': [{'x': 1}], 'a': 'x'}]
+        db = Database().connect(source=data, db=ColumnarDB())
+        self.assertEqual(db.filter('b', 1), data[:1])
+        self.assertEqual(db.filter('a', 'x'), data[1:])
+        self.assertEqual(db.filter('a', 1), [])
+        self.assertEqual(db.get('c', 1), None)
+
+    def test_filter_many(self):
+        """Test to make sure batch filtering groups the same rows as filter for every value"""
+        columnar_db = Database().connect(source='data/tickets.json', db=ColumnarDB())
+        batches = [('assignee_id', [24, 38, 7, 10 ** 6, True, 'x']), ('tags', ['Ohio', 'Idaho', 'nothing']),
+                   ('has_incidents', [False, 1, 2]), ('status', ['hold', 'open', 5])]
+        for db in [self.ticket_db, columnar_db]:
+            for field, values in batches:
+                result = db.filter_many(field, values)
+                self.assertEqual(set(result), set(values))
+                for value in values:
+                    self.assertEqual(result[value], self.ticket_db.filter(field, value))
+
+    def test_snapshot(self):
+        """Test to make sure snapshot is written, reused and refreshed when the source changes"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = shutil.copy('data/users.json', directory)
+            policy = IndexPolicy(eager=['_id'])
+            db = Database().connect(source=path, index_policy=policy, snapshot=True)
+            self.assertTrue(os.path.exists(snapshot_path(path)))
+
+            restored_db = Database().connect(source=path, snapshot=True)
+            self.assertEqual(restored_db.fields(), self.user_db.fields())
+            self.assertEqual(set(restored_db.index_stats()), {'_id'})
+            self.assertEqual(restored_db.filter('tags', 'Roberts'), self.user_db.filter('tags', 'Roberts'))
+
+            # snapshots are pickles, one that other users can write isn't loaded
+            self.assertEqual(os.stat(snapshot_path(path)).st_mode & 0o022, 0)
+            os.chmod(snapshot_path(path), 0o666)
+            self.assertEqual(set(Database().connect(source=path, snapshot=True).index_stats()), set())
+            # the source was parsed and its snapshot written again
+            self.assertEqual(os.stat(snapshot_path(path)).st_mode & 0o022, 0)
+
+            with open(path, 'w') as json_file:
+                json.dump([{'_id': 1}], json_file)
+            changed_db = Database().connect(source=path, snapshot=True)
+            self.assertEqual(set(changed_db.fields()), {'_id'})
+            self.assertEqual(db.get('_id', 1)['_id'], 1)
+
+            class RegeneratedDB(JSONDB):
+                """Source file is regenerated right after it was parsed the first time"""
+                regenerated = False
+
+                def add_data(self, data):
+                    super().add_data(data)
+                    if not RegeneratedDB.regenerated:
+                        RegeneratedDB.regenerated = True
+                        with open(path, 'w') as regenerated_file:
+                            json.dump([{'_id': 'newer'}], regenerated_file)
+
+            with open(path, 'w') as json_file:
+                json.dump([{'_id': 'old'}], json_file)
+            os.remove(snapshot_path(path))
+            Database().connect(source=path, db=RegeneratedDB(), snapshot=True)
+            reconnected = Database().connect(source=path, db=RegeneratedDB(), snapshot=True)
+            self.assertEqual(reconnected.get('_id', 'newer'), {'_id': 'newer'})
+
+    def test_relations(self):
+        """Test to make sure related entities are joined through foreign keys"""
+        databases = {USER: self.user_db, TICKET: self.ticket_db, ORGANIZATION: self.organization_db}
+        joins = Relations(databases, relations)
+
+        ticket = self.ticket_db.get('submitter_id', 38)
+        related = joins.related(TICKET, ticket)
+        self.assertEqual(related['submitter'], self.user_db.get('_id', 38))
+        self.assertEqual(related['organization'], self.organization_db.get('_id', ticket['organization_id']))
+
+        related = joins.related(ORGANIZATION, self.organization_db.get('_id', 101))
+        self.assertEqual(related['tickets'], self.ticket_db.filter('organization_id', 101))
+        self.assertEqual(related['users'], self.user_db.filter('organization_id', 101))
+
+        results = joins.search(USER, 'active', True, names=['submitted_tickets'])
+        for user, related in results:
+            self.assertEqual(related['submitted_tickets'], self.ticket_db.filter('submitter_id', user['_id']))
+
+        with self.assertRaises(FieldNotFoundError):
+            joins.related(USER, self.user_db.get('_id', 1), names=['bad_relation'])
+
+    def test_query(self):
+        """Test to make sure compound queries return the same rows as filtering in python"""
+        tickets = self.ticket_db.filter('via', 'web') + self.ticket_db.filter('via', 'chat') + \
+            self.ticket_db.filter('via', 'voice')
+        tickets.sort(key=lambda ticket: ticket['_id'])
+
+        queries = [
+            ('status = "pending" AND priority = "high"',
+             lambda t: t['status'] == 'pending' and t['priority'] == 'high'),
+            ('tags CONTAINS "Ohio" OR NOT (type = "incident")',
+             lambda t: 'Ohio' in t['tags'] or t.get('type') != 'incident'),
+            ("submitter_id >= 50 AND submitter_id < 60 AND subject STARTSWITH 'A Catastrophe'",
+             lambda t: 50 <= t['submitter_id'] < 60 and t['subject'].startswith('A Catastrophe')),
+            (Eq('has_incidents', True) & ~Contains('tags', 'Ohio') & Compare('created_at', '>', '2016-06'),
+             lambda t: t['has_incidents'] and 'Ohio' not in t['tags'] and t['created_at'] > '2016-06'),
+            (Prefix('tags', 'New') | Eq('assignee_id', 24),
+             lambda t: any(tag.startswith('New') for tag in t['tags']) or t.get('assignee_id') == 24),
+        ]
+        for expression, condition in queries:
+            result = sorted(self.ticket_db.query(expression), key=lambda ticket: ticket['_id'])
+            self.assertEqual(result, [ticket for ticket in tickets if condition(ticket)])
+
+    def test_explain_and_invalid_query(self):
+        """Test to make sure explain shows the plan and invalid queries raise an error"""
+        plan = self.ticket_db.explain('status = "pending" AND priority = "high" AND description STARTSWITH "A"')
+        self.assertIn('INTERSECT', plan)
+        self.assertIn('examined', plan)
+        self.assertIn('FULL SCAN', self.ticket_db.explain('NOT status = "pending"'))
+
+        for expression in ['status = ', 'status == "open"', '(status = "open"', 'status < true', 'status = 1.5']:
+            with self.assertRaises(QueryIsInvalidError):
+                self.ticket_db.query(expression)
+        with self.assertRaises(FieldNotFoundError):
+            self.ticket_db.query('bad_field = 1')
+
+    def test_range_queries(self):
+        """Test to make sure timestamp range queries compare normalized epochs and sort by time"""
+        db = Database().connect(source='data/tickets.json', index_policy=IndexPolicy(ranged=['created_at']))
+        self.assertIn('created_at:range', db.index_stats())
+
+        start, end = '2016-03-01T00:00:00 +00:00', '2016-05-01T00:00:00 -10:00'
+        low, high = parse_timestamp(start), parse_timestamp(end)
+        tickets = self.ticket_db.filter('has_incidents', True) + self.ticket_db.filter('has_incidents', False)
+
+        result = db.between('created_at', start, end)
+        expected = [t for t in tickets if low <= parse_timestamp(t['created_at']) <= high]
+        self.assertEqual(sorted(t['_id'] for t in result), sorted(t['_id'] for t in expected))
+        epochs = [parse_timestamp(t['created_at']) for t in result]
+        self.assertEqual(epochs, sorted(epochs))
+
+        before = db.before('due_at', start)
+        self.assertTrue(all(parse_timestamp(t['due_at']) < low for t in before))
+        self.assertEqual(len(before) + len(db.after('due_at', low)) + len(db.between('due_at', low, low)),
+                         len([t for t in tickets if 'due_at' in t]))
+
+    def test_full_text_search(self):
+        """Test to make sure full-text search matches words and phrases and ranks them"""
+        result = self.ticket_db.search('Korea')
+        self.assertEqual({ticket['subject'] for ticket in result},
+                         {'A Catastrophe in Korea (North)', 'A Catastrophe in Korea (South)'})
+
+        result = self.ticket_db.search('"catastrophe in korea" north')
+        self.assertEqual(result[0]['subject'], 'A Catastrophe in Korea (North)')
+        self.assertEqual(self.ticket_db.search('"korea catastrophe"'), [])
+        self.assertEqual(self.ticket_db.search('this_term_not_exist'), [])
+        self.assertEqual(len(self.ticket_db.search('catastrophe', limit=3)), 3)
+
+        self.assertNotEqual(len(self.user_db.search('Francisca', fields=['name'])), EMPTY_LENGTH)
+        with self.assertRaises(FieldNotFoundError):
+            self.user_db.search('Francisca', fields=['bad_field'])
+
+    def test_insert_update_delete(self):
+        """Test to make sure writes keep built indexes in sync and are replayed from the write-ahead log"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = shutil.copy('data/tickets.json', directory)
+            policy = IndexPolicy(eager=['status', 'tags'], ranged=['created_at'])
+            db = Database().connect(source=path, index_policy=policy)
+            self.assertEqual(len(db.search('Korea')), 2)
+
+            db.insert({'_id': 'new', 'status': 'open', 'tags': ['Ohio'], 'subject': 'Korea again',
+                       'created_at': '2030-01-01T00:00:00 +00:00', 'new_field': 1})
+            self.assertIn('new_field', db.fields())
+            self.assertEqual(db.get('_id', 'new')['status'], 'open')
+            self.assertEqual(db.after('created_at', '2029-01-01')[0]['_id'], 'new')
+            self.assertEqual(len(db.search('Korea')), 3)
+
+            self.assertEqual(db.update('tags', 'Ohio', {'status': 'archived'}), 15)
+            self.assertTrue(all(ticket['status'] == 'archived' for ticket in db.filter('tags', 'Ohio')))
+            self.assertFalse(any('Ohio' in ticket['tags'] for ticket in db.filter('status', 'pending')))
+
+            self.assertEqual(db.delete('status', 'archived'), 15)
+            self.assertEqual(db.filter('tags', 'Ohio'), [])
+            self.assertEqual(db.get('_id', 'new'), None)
+            self.assertEqual(len(db.query('NOT status = "hold"')) + len(db.filter('status', 'hold')), len(db.db))
+            self.assertEqual(len(db.db), 186)
+
+            expected = {status: db.filter('status', status) for status in ['open', 'pending', 'hold', 'solved', 'closed']}
+            self.assertTrue(os.path.exists(wal_path(path)))
+            for reconnected in [Database().connect(source=path), Database().connect(source=path, snapshot=True),
+                                Database().connect(source=path, snapshot=True)]:
+                for status, tickets in expected.items():
+                    self.assertEqual(reconnected.filter('status', status), tickets)
+
+            reconnected.insert({'_id': 'after_snapshot', 'status': 'open'})
+            self.assertEqual(Database().connect(source=path, snapshot=True).get('_id', 'after_snapshot')['status'],
+                             'open')
+
+            reconnected.db.compact()
+            self.assertFalse(os.path.exists(wal_path(path)))
+            self.assertEqual(len(Database().connect(source=path).filter('tags', 'Ohio')), EMPTY_LENGTH)
+
+            # a regenerated file already holds logged rows, the log of the old file isn't replayed onto it
+            reconnected.insert({'_id': 'regenerated', 'status': 'open'})
+            with open(path) as json_file:
+                tickets = json.load(json_file)
+            with open(path, 'w') as json_file:
+                json.dump(tickets + [{'_id': 'regenerated', 'status': 'new'}], json_file)
+            reconnected.swap(reconnected.load())
+            self.assertEqual(reconnected.filter('_id', 'regenerated'), [{'_id': 'regenerated', 'status': 'new'}])
+            reconnected.insert({'_id': 'after_regeneration'})
+            self.assertTrue(os.path.exists(wal_path(path) + '.old'))
+            self.assertEqual(len(Database().connect(source=path).filter('_id', 'regenerated')), 1)
+            self.assertEqual(len(Database().connect(source=path).filter('_id', 'after_regeneration')), 1)
+
+    def test_watch_reloads_source(self):
+        """Test to make sure a changed source is reloaded and swapped in without touching the old db"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.json')
+            with open(path, 'w') as json_file:
+                json.dump([{'_id': 1, 'name': 'old'}], json_file)
+
+            db = Database().connect(source=path, index_policy=IndexPolicy(eager=['_id']))
+            watcher = db.watch(interval=0.01)
+            old_db = db.db
+            try:
+                with open(path, 'w') as json_file:
+                    json.dump([{'_id': 1, 'name': 'new'}, {'_id': 2, 'name': 'added'}], json_file)
+                for _ in range(500):
+                    if watcher.reloads:
+                        break
+                    time.sleep(0.01)
+            finally:
+                db.unwatch()
+
+            self.assertEqual(db.get('_id', 1)['name'], 'new')
+            self.assertEqual(set(db.index_stats()), {'_id'})
+            self.assertEqual(old_db.get('_id', 1)['name'], 'old')
+
+            metrics = watcher.metrics()
+            self.assertEqual(metrics['reloads'], 1)
+            self.assertIsNotNone(metrics['last_reload_seconds'])
+
+            with open(path, 'w') as json_file:
+                json_file.write('[{"_id": ')
+            self.assertFalse(watcher.check())
+            self.assertEqual(watcher.metrics()['failed_reloads'], 1)
+            self.assertEqual(db.get('_id', 2)['name'], 'added')
+
+            # writes made while a reload is loading are replayed on the reloaded db
+            with open(path, 'w') as json_file:
+                json.dump([{'_id': 1, 'name': 'new'}], json_file)
+            reloaded_db = db.load()
+            db.insert({'_id': 2, 'name': 'during reload'})
+            replaced_db = db.db
+            db.swap(reloaded_db)
+            self.assertIs(db.db, reloaded_db)
+            self.assertEqual(db.get('_id', 2)['name'], 'during reload')
+            with self.assertRaises(DatabaseIsReloadedError):
+                replaced_db.insert({'_id': 3})
+            db.insert({'_id': 3, 'name': 'after reload'})
+            reconnected = Database().connect(source=path)
+            self.assertEqual([reconnected.get('_id', _id)['name'] for _id in [2, 3]], ['during reload', 'after reload'])
+
+            # reloads of a given db keep its settings
+            policy = IndexPolicy(eager=['name'])
+            db = Database().connect(source=path, db=JSONDB(index_policy=policy, durable=True, decoder='json'))
+            self.assertEqual(set(db.load().index_stats()), {'name'})
+            streaming = Database().connect(source=path, db=StreamingJSONDB(chunk_size=3))
+            self.assertIsInstance(streaming.load(), StreamingJSONDB)
+            self.assertEqual(streaming.load().get('_id', 1), {'_id': 1, 'name': 'new'})
+
+    def test_query_executor(self):
+        """Test to make sure queries run in a thread pool while writes happen"""
+        databases = {USER: self.user_db, TICKET: self.ticket_db, ORGANIZATION: self.organization_db}
+        with QueryExecutor(databases, max_workers=8) as executor:
+            user = executor.get(USER, '_id', 9)
+            tickets = executor.filter(TICKET, 'tags', 'Ohio')
+            futures = executor.map([(ORGANIZATION, 'get', '_id', 101), (TICKET, 'query', 'status = "hold"')])
+            self.assertEqual(user.result(), self.user_db.get('_id', 9))
+            self.assertEqual(tickets.result(), self.ticket_db.filter('tags', 'Ohio'))
+            self.assertEqual(futures[0].result()['_id'], 101)
+            self.assertEqual(futures[1].result(), self.ticket_db.filter('status', 'hold'))
+
+            db = Database().connect(source=[{'_id': i, 'even': i % 2 == 0} for i in range(100)])
+            writes = [executor.submit(db, 'insert', {'_id': i, 'even': i % 2 == 0}) for i in range(100, 300)]
+            reads = [executor.filter(db, 'even', True) for _ in range(200)]
+            for future in writes + reads:
+                future.result()
+            self.assertEqual(len(db.filter('even', True)), 150)
+            self.assertTrue(all(len(future.result()) >= 50 for future in reads))
+
+    def test_read_write_lock(self):
+        """Test to make sure a writer waits for readers and excludes them"""
+        lock = ReadWriteLock()
+        events = []
+        lock.acquire_read()
+
+        def write():
+            with lock.write():
+                events.append('write')
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        time.sleep(0.05)
+        events.append('read done')
+        lock.release_read()
+        writer.join()
+        self.assertEqual(events, ['read done', 'write'])
+
+        # a waiting writer turns new readers away, not nested reads of a thread holding the lock
+        lock.acquire_read()
+        writer = threading.Thread(target=write)
+        writer.start()
+        time.sleep(0.05)
+        reader = threading.Thread(target=lambda: events.append(lock.acquire_read(blocking=False)))
+        reader.start()
+        reader.join()
+        self.assertTrue(lock.acquire_read(blocking=False))
+        lock.release_read()
+        lock.release_read()
+        writer.join()
+        self.assertEqual(events[2:], [False, 'write'])
+
+    def test_concurrent_lazy_index_builds(self):
+        """Test to make sure indexes built lazily by readers don't change dictionaries other readers iterate"""
+        fields = [f'field{i}' for i in range(60)]
+        db = Database().connect(source=[{field: f'value {i % 7}' for field in fields} for i in range(200)])
+        errors = []
+
+        def read(method, *args):
+            try:
+                for field in fields:
+                    getattr(db, method)(field, *args)
+            except Exception as e:
+                errors.append(e)
+
+        def stats():
+            try:
+                while any(thread.is_alive() for thread in readers):
+                    db.index_stats()
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            readers = [threading.Thread(target=read, args=('filter', 'value 1')),
+                       threading.Thread(target=read, args=('group_by',)),
+                       threading.Thread(target=read, args=('typeahead', 'valu 2', 'fuzzy')),
+                       threading.Thread(target=read, args=('filter', 'value 2'))]
+            threads = readers + [threading.Thread(target=stats) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(db.filter('field59', 'value 1')), 29)
+        self.assertEqual(db.typeahead('field0', 'valu 3', 'fuzzy', limit=1), [db.get('field0', 'value 3')])
+
+    def test_parallel_scan(self):
+        """Test to make sure the sharded multi-process scan returns rows in dataset order"""
+        expression = 'description STARTSWITH "Nostrud" OR tags CONTAINS "Ohio"'
+        self.assertEqual(self.ticket_db.scan(expression, workers=2), self.ticket_db.query(expression))
+        self.assertEqual(self.ticket_db.parallel_filter('submitter_id', 38, workers=2),
+                         self.ticket_db.filter('submitter_id', 38))
+
+        db = Database().connect(source=[{'_id': i} for i in range(10)])
+        self.assertEqual(len(db.scan('_id >= 5', workers=2)), 5)
+        db.insert({'_id': 20})
+        db.delete('_id', 5)
+        self.assertEqual([item['_id'] for item in db.scan('_id >= 5', workers=2)], [6, 7, 8, 9, 20])
+
+        # concurrent scans replacing the shared scanner don't close it under each other
+        expected = self.ticket_db.query(expression)
+        with QueryExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.ticket_db, 'scan', expression, workers=1 + i % 2) for i in range(8)]
+            for future in futures:
+                self.assertEqual(future.result(), expected)
+
+    def test_async_database(self):
+        """Test to make sure the asyncio facade answers like Database and keeps the connection check"""
+
+        async def run():
+            db = AsyncDatabase(batch_size=3)
+            with self.assertRaises(DatabaseIsNotConnectedError):
+                await db.get('_id', 1)
+            with self.assertRaises(DatabaseIsNotConnectedError):
+                async for _ in db.iter_filter('_id', 1):
+                    pass
+
+            await db.connect('data/tickets.json', index_policy=IndexPolicy(eager=['status']))
+            self.assertEqual(await db.fields(), self.ticket_db.fields())
+            self.assertEqual(await db.filter('status', 'hold'), self.ticket_db.filter('status', 'hold'))
+            self.assertEqual(await db.get('submitter_id', 38), self.ticket_db.get('submitter_id', 38))
+            self.assertEqual([item async for item in db.iter_filter('tags', 'Ohio')],
+                             self.ticket_db.filter('tags', 'Ohio'))
+            self.assertEqual([item async for item in db.iter_filter('status', 'hold')],
+                             self.ticket_db.filter('status', 'hold'))
+
+            # the first item is streamed once its page is read, not the whole result
+            pages = []
+            page = db.database.page
+            db.database.page = lambda *args: pages.append(args) or page(*args)
+            async for _ in db.iter_filter('tags', 'Ohio'):
+                break
+            self.assertEqual(len(pages), 1)
+            self.assertEqual(await db.call('query', 'status = "hold"'), self.ticket_db.filter('status', 'hold'))
+
+            # indexed lookups go to the executor while a writer holds the lock, the loop keeps running
+            ticks = []
+
+            async def tick():
+                for _ in range(10):
+                    ticks.append(None)
+                    await asyncio.sleep(0.01)
+
+            db.database.db.lock.acquire_write()
+            threading.Timer(0.1, db.database.db.lock.release_write).start()
+            ticker = asyncio.ensure_future(tick())
+            self.assertEqual(await db.get('status', 'hold'), self.ticket_db.get('status', 'hold'))
+            self.assertGreater(len(ticks), 1)
+            await ticker
+
+        asyncio.run(run())
+
+    def test_pagination(self):
+        """Test to make sure pages, offsets, lazy results and counts match the full filter"""
+        for policy in [IndexPolicy(), IndexPolicy(default='off')]:
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            db = Database().connect(source=shutil.copy('data/tickets.json', directory.name), index_policy=policy)
+            expected = db.filter('status', 'open')
+            self.assertEqual(db.count('status', 'open'), len(expected))
+            self.assertEqual(db.filter('status', 'open', limit=5, offset=3), expected[3:8])
+            self.assertEqual(list(db.filter('status', 'open', lazy=True, offset=2, limit=40)), expected[2:42])
+
+            items, cursor = [], None
+            while True:
+                page = db.page('status', 'open', limit=7, cursor=cursor)
+                items.extend(page)
+                if page.cursor is None:
+                    break
+                cursor = page.cursor
+            self.assertEqual(items, expected)
+
+            page = db.page('status', 'open', limit=3)
+            db.insert({'_id': 'new', 'status': 'open'})
+            self.assertEqual(db.page('status', 'open', limit=3, cursor=page.cursor).items, expected[3:6])
+            with self.assertRaises(QueryIsInvalidError):
+                db.page('status', 'hold', limit=3, cursor=page.cursor)
+            db.db.compact()
+            with self.assertRaises(QueryIsInvalidError):
+                db.page('status', 'open', limit=3, cursor=page.cursor)
+            for options in [{'offset': -1}, {'limit': -1}, {'offset': -1, 'lazy': True}]:
+                with self.assertRaises(AssertionError):
+                    db.filter('status', 'open', **options)
+            with self.assertRaises(AssertionError):
+                db.page('status', 'open', limit=0)
+
+        columnar = Database().connect(source='data/tickets.json', db=ColumnarDB())
+        self.assertEqual(columnar.count('status', 'open'), self.ticket_db.count('status', 'open'))
+        self.assertEqual(columnar.page('status', 'open', limit=4, cursor='4').items,
+                         self.ticket_db.filter('status', 'open', limit=4, offset=4))
+        with self.assertRaises(AssertionError):
+            columnar.page('status', 'open', limit=0)
+
+    def test_query_cache(self):
+        """Test to make sure cached results are reused, evicted by size and invalidated by writes"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = QueryCache()
+        db = Database(cache=cache).connect(source=shutil.copy('data/tickets.json', directory.name))
+        expected = db.filter('status', 'pending')
+        self.assertEqual(db.filter('status', 'pending'), expected)
+        self.assertEqual(db.get('has_incidents', True), db.get('has_incidents', 1))
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        db.insert({'_id': 'new', 'status': 'pending'})
+        self.assertEqual(len(db.filter('status', 'pending')), len(expected) + 1)
+        db.db.add_data([{'_id': 'other', 'status': 'pending'}])
+        self.assertEqual(db.filter('status', 'pending'), [{'_id': 'other', 'status': 'pending'}])
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+        statuses = ['pending', 'open', 'hold', 'solved']
+        small = QueryCache(max_bytes=max(estimate_size(self.ticket_db.filter('status', s)) for s in statuses))
+        db = Database(cache=small).connect(source='data/tickets.json')
+        for status in statuses:
+            self.assertEqual(db.filter('status', status), self.ticket_db.filter('status', status))
+        self.assertGreater(small.stats()['evictions'], 0)
+        self.assertLessEqual(small.stats()['size_bytes'], small.max_bytes)
+
+        # generators of streaming dbs are read by the caller, they aren't cached
+        db = Database(cache=cache).connect(source='data/tickets.json', db=StreamingJSONDB())
+        for _ in range(2):
+            self.assertEqual(list(db.filter('status', 'hold')), self.ticket_db.filter('status', 'hold'))
+        self.assertEqual(db.get('status', 'hold'), self.ticket_db.get('status', 'hold'))
+        self.assertEqual(db.get('status', 'hold'), self.ticket_db.get('status', 'hold'))
+
+    def test_instrumentation(self):
+        """Test to make sure latency, rows, hit rates and slow queries are recorded and exported"""
+        instrumentation = Instrumentation(slow_threshold=0, profile=True)
+        db = Database(cache=QueryCache(), instrumentation=instrumentation)
+        db.connect(source='data/tickets.json', index_policy=IndexPolicy(default='off'))
+        expected = self.ticket_db.filter('status', 'pending')
+        self.assertEqual(db.filter('status', 'pending'), expected)
+        self.assertEqual(db.filter('status', 'pending'), expected)
+        self.assertEqual(db.count('status', 'pending'), len(expected))
+
+        metrics = instrumentation.metrics()
+        self.assertEqual(metrics['operations']['filter']['count'], 2)
+        self.assertEqual(metrics['operations']['parse']['count'], 1)
+        self.assertEqual(metrics['rows']['filter'], {'scanned': len(db.db), 'returned': len(expected)})
+        self.assertEqual(metrics['hit_rates'], {'cache': 0.5, 'index': 0.0})
+        self.assertEqual(len(metrics['slow_queries']), 3)
+        self.assertIn('cumulative', instrumentation.slow_queries[0]['profile'])
+        self.assertEqual(json.loads(instrumentation.to_json())['rows'], metrics['rows'])
+        prometheus = instrumentation.to_prometheus()
+        self.assertIn('jsondb_operation_seconds_count{operation="filter"} 2', prometheus)
+        self.assertIn('jsondb_lookups_total{kind="cache",result="hit"} 1', prometheus)
+
+        db.instrument(None)
+        db.filter('status', 'open')
+        self.assertEqual(instrumentation.metrics()['operations']['filter']['count'], 2)
+
+    def test_schema(self):
+        """Test to make sure schema is inferred, kept up to date by writes and coerces typed values"""
+        schema = self.user_db.fields()
+        self.assertEqual((schema['_id'].type, schema['_id'].nullable, schema['_id'].cardinality), ('int', False, 75))
+        self.assertEqual((schema['tags'].is_list, schema['tags'].item_types), (True, {'str'}))
+        self.assertTrue(schema['organization_id'].nullable)
+        self.assertEqual(schema.coerce('_id', '71'), 71)
+        self.assertEqual(schema.coerce('_id', '-71'), -71)
+        self.assertEqual(schema.coerce('_id', '--5'), '--5')
+        self.assertEqual(schema.coerce('_id', '²'), '²')
+        self.assertEqual(schema.coerce('active', 'false'), False)
+        self.assertEqual(schema.coerce('phone', '8335'), '8335')
+        with self.assertRaises(FieldNotFoundError):
+            schema.coerce('bad_field', '1')
+
+        data = [{'_id': 1, 'a': 'x'}, {'_id': 2, 'a': ['x', 1]}, {'_id': 3, 'a': 1.5}]
+        db = Database().connect(source=data, index_policy=IndexPolicy(default='off'))
+        self.assertEqual(db.fields()['a'].type, 'mixed')
+        self.assertEqual(db.filter('a', 'x'), data[:2])
+        self.assertEqual(db.filter('_id', '1'), [])
+        db.insert({'_id': 'new', 'b': None})
+        self.assertEqual(db.fields()['_id'].types, {'int', 'str'})
+        self.assertTrue(db.fields()['b'].nullable and db.fields()['a'].nullable)
+        self.assertEqual(db.get('_id', 'new'), {'_id': 'new', 'b': None})
+
+    def test_aggregations(self):
+        """Test to make sure aggregations match counting filter results, with and without indexes"""
+        with open('data/tickets.json') as json_file:
+            tickets = json.load(json_file)
+        for policy in [IndexPolicy(), IndexPolicy(eager=['status', 'tags']), IndexPolicy(default='off')]:
+            db = Database().connect(source=[dict(ticket) for ticket in tickets], index_policy=policy)
+            for field in ['status', 'tags', 'organization_id', 'has_incidents']:
+                groups = db.group_by(field)
+                self.assertEqual(groups, {value: len(self.ticket_db.filter(field, value)) for value in groups})
+            self.assertEqual(set(db.distinct('status')), {'open', 'pending', 'hold', 'closed', 'solved'})
+            top = db.top_k('tags', 3)
+            self.assertEqual([count for _, count in top], sorted(db.group_by('tags').values(), reverse=True)[:3])
+
+            moments = sorted(tickets, key=lambda ticket: parse_timestamp(ticket['created_at']))
+            self.assertEqual(db.min('created_at'), moments[0]['created_at'])
+            self.assertEqual(db.max('created_at'), moments[-1]['created_at'])
+            self.assertEqual(db.max('submitter_id'), max(ticket['submitter_id'] for ticket in tickets))
+
+            closed = db.group_by('status').get('closed', 0)
+            db.update('status', 'pending', {'status': 'closed'})
+            db.insert({'_id': 'new', 'status': 'closed', 'submitter_id': 10 ** 6})
+            db.delete('_id', tickets[0]['_id'])
+            self.assertEqual(db.group_by('status')['closed'], len(db.filter('status', 'closed')))
+            self.assertNotIn('pending', db.group_by('status'))
+            self.assertGreater(db.group_by('status')['closed'], closed)
+            self.assertEqual(db.max('submitter_id'), 10 ** 6)
+
+        # floats aren't keys of indexes, so indexed and scanned answers must not differ
+        db = Database().connect(source=[{'price': 1}, {'price': 2.5}, {'price': .5}, {'price': True}])
+        self.assertEqual((db.min('price'), db.max('price')), (.5, 2.5))
+        db.group_by('price')
+        db.filter('price', 1)
+        self.assertEqual((db.min('price'), db.max('price')), (.5, 2.5))
+
+    def test_decoders(self):
+        """Test to make sure every installed decoder loads the same rows and reports where parsing failed"""
+        with open('data/tickets.json') as json_file:
+            tickets = json.load(json_file)
+        for name in available_decoders():
+            db = Database().connect(source='data/tickets.json', decoder=name)
+            self.assertEqual(db.filter('status', 'open'), [t for t in tickets if t['status'] == 'open'])
+            # values are only interned when it's asked for
+            interned_db = Database().connect(source='data/tickets.json', decoder=DECODERS[name](intern=True))
+            statuses = {id(item['status']) for item in interned_db.filter('status', 'pending')}
+            self.assertEqual(len(statuses), 1)
+            self.assertEqual(interned_db.filter('status', 'open'), db.filter('status', 'open'))
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'broken.json')
+                with open(path, 'w') as json_file:
+                    json_file.write('[\n  {"_id": 1},\n  {"_id": 2,}\n]')
+                with self.assertRaisesRegex(DataIsNotJSONError, 'line 3 column'):
+                    Database().connect(source=path, decoder=name)
+        with self.assertRaisesRegex(DataIsNotJSONError, 'can not be read'):
+            Database().connect(source='data/missing.json')
+
+    def test_connect_all(self):
+        """Test to make sure sources loaded concurrently in threads or processes answer like connect"""
+        for mode in ['threads', 'processes']:
+            databases = connect_all(entities, mode=mode, index_policy=IndexPolicy(eager=['_id']))
+            self.assertEqual(set(databases), {USER, TICKET, ORGANIZATION})
+            for entity, expected in [(USER, self.user_db), (TICKET, self.ticket_db),
+                                     (ORGANIZATION, self.organization_db)]:
+                self.assertGreater(databases[entity].load_seconds, 0)
+                self.assertEqual(databases[entity].fields(), expected.fields())
+                self.assertEqual(databases[entity].filter('tags', 'Ohio'), expected.filter('tags', 'Ohio'))
+                self.assertIn('_id', databases[entity].index_stats())
+        with self.assertRaises(DataIsNotJSONError):
+            connect_all({USER: 'data/missing.json'})
+
+        # parse processes import the main module again, importing main_v2 must not connect, even when
+        # its own connect would parse files in processes (data of 8 MB or more)
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'data'))
+            for entity, path in entities.items():
+                with open(path) as json_file:
+                    data = json.load(json_file)
+                with open(os.path.join(directory, path), 'w') as json_file:
+                    json.dump(data * 100 if entity == TICKET else data, json_file)
+            script = os.path.join(directory, 'connect_in_processes.py')
+            with open(script, 'w') as script_file:
+                script_file.write('import main_v2\n'
+                                  'from database.loader import connect_all\n'
+                                  'from constants import entities\n'
+                                  'if __name__ == "__main__":\n'
+                                  '    print(len(connect_all(entities, snapshot=True)))\n')
+            environment = dict(os.environ, PYTHONPATH=os.getcwd())
+            completed = subprocess.run([sys.executable, script], capture_output=True, text=True, timeout=120,
+                                       cwd=directory, env=environment)
+            self.assertEqual(completed.returncode, 0, completed.stderr)
+            self.assertEqual(completed.stdout.strip(), '3')
+
+    def test_typeahead(self):
+        """Test to make sure typed text finds values exactly, by prefix and fuzzily, and writes keep it in sync"""
+        self.assertEqual(self.user_db.typeahead('name', 'FRANCISCA rasmussen', mode='exact')[0]['_id'], 1)
+        self.assertEqual({user['name'] for user in self.user_db.typeahead('name', 'fra')},
+                         {'Francisca Rasmussen', 'Francis Rodrigüez', 'Francis Bailey'})
+        self.assertEqual(self.user_db.typeahead('name', 'rasm')[0]['name'], 'Francisca Rasmussen')
+        self.assertEqual(self.user_db.typeahead('name', 'fransisca', mode='fuzzy')[0]['name'], 'Francisca Rasmussen')
+        self.assertEqual(self.user_db.typeahead('email', 'coffeyrasmusen@', mode='fuzzy')[0]['email'],
+                         'coffeyrasmussen@flotonic.com')
+        self.assertEqual(len(self.user_db.typeahead('name', 'fra', limit=2)), 2)
+        self.assertEqual(self.user_db.typeahead('name', 'zzzz', mode='fuzzy'), [])
+        self.assertEqual([user['name'] for user in self.user_db.suggest('name', 'francis')][:2],
+                         ['Francis Bailey', 'Francis Rodrigüez'])
+        with self.assertRaises(FieldNotFoundError):
+            self.user_db.typeahead('missing', 'text')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = shutil.copy('data/users.json', directory)
+            db = Database().connect(source=path, index_policy=IndexPolicy(lookup=['name']))
+            self.assertIn('name:lookup', db.index_stats())
+            db.insert({'_id': 1000, 'name': 'Frankie Smith'})
+            self.assertEqual(db.typeahead('name', 'frankie')[0]['_id'], 1000)
+            self.assertEqual(db.typeahead('name', 'frankei', mode='fuzzy')[0]['_id'], 1000)
+            db.delete('_id', 1000)
+            self.assertEqual(db.typeahead('name', 'frankie'), [])
+
+    def test_projection_and_export(self):
+        """Test to make sure projected results and exports hold only the requested fields of matched items"""
+        fields = ['_id', 'status', 'tags']
+        tickets = self.ticket_db.filter('tags', 'Ohio')
+        projected = [{field: ticket[field] for field in fields} for ticket in tickets]
+        self.assertEqual(self.ticket_db.filter('tags', 'Ohio', fields=fields), projected)
+        self.assertEqual(list(self.ticket_db.filter('tags', 'Ohio', lazy=True, fields=fields)), projected)
+        self.assertEqual(self.ticket_db.query('tags CONTAINS "Ohio"', fields=fields), projected)
+        columnar_db = Database().connect(source='data/tickets.json', db=ColumnarDB())
+        self.assertEqual(columnar_db.filter('tags', 'Ohio', fields=fields), projected)
+        self.assertEqual(self.user_db.filter('_id', 1, fields=['organization_id']), [{'organization_id': 119}])
+        with self.assertRaises(FieldNotFoundError):
+            self.ticket_db.filter('tags', 'Ohio', fields=['missing'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tickets.jsonl')
+            self.assertEqual(self.ticket_db.export(path, field='tags', value='Ohio', fields=fields), len(tickets))
+            with open(path, encoding='utf-8') as jsonl_file:
+                self.assertEqual([json.loads(line) for line in jsonl_file], projected)
+
+            path = os.path.join(directory, 'tickets.csv')
+            self.assertEqual(self.ticket_db.export(path, 'csv', 'tags', 'Ohio', fields), len(tickets))
+            with open(path, newline='', encoding='utf-8') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+            self.assertEqual([row['_id'] for row in rows], [ticket['_id'] for ticket in tickets])
+            self.assertEqual(json.loads(rows[0]['tags']), tickets[0]['tags'])
+
+            path = os.path.join(directory, 'tickets.columns')
+            self.assertEqual(self.ticket_db.export(path, 'columnar'), len(self.ticket_db.db))
+            with open('data/tickets.json') as json_file:
+                data = json.load(json_file)
+            columns = next(read_columnar(path))
+            self.assertEqual(set(columns), set(self.ticket_db.fields()))
+            self.assertEqual(columns['_id'], [ticket['_id'] for ticket in data])
+            self.assertEqual(columns['assignee_id'], [ticket.get('assignee_id') for ticket in data])
+            self.assertEqual(columns['tags'], [ticket['tags'] for ticket in data])
+
+            # every kind of column round trips, nulls included
+            rows = [{'n': 1, 'f': .5, 'b': True, 's': 'a', 'j': [1, {'x': 'é'}], 'm': 1},
+                    {'n': None, 'f': 2.0, 'b': False, 's': 'é', 'j': None, 'm': 'one'},
+                    {'n': -2 ** 63, 'b': None, 's': 'a', 'm': True}]
+            path = os.path.join(directory, 'rows.columns')
+            export(rows, path, 'columnar', ['n', 'f', 'b', 's', 'j', 'm', 'missing'])
+            columns = next(read_columnar(path))
+            for field in ['n', 'f', 'b', 's', 'j', 'm', 'missing']:
+                self.assertEqual(columns[field], [row.get(field) for row in rows])
+            with open(path, 'r+b') as columnar_file:
+                columnar_file.write(b'NOTJSONDB')
+            with self.assertRaises(DataIsInvalidError):
+                next(read_columnar(path))